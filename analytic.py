@@ -0,0 +1,220 @@
+# analytic.py
+"""
+Analytic quantities for simple swept solids – no geometry kernel needed.
+
+Handles elements whose Body representation is a single
+  • IfcExtrudedAreaSolid extruded perpendicular to its profile
+    (rectangle, hollow rectangle, circle, hollow circle, I-shape,
+     arbitrary straight-segment profile with or without voids)
+  • IfcSweptDiskSolid along an IfcPolyline
+and no openings. Everything else returns None → caller falls back to the mesh.
+
+Values are in SI (m, m², m³) like the tessellated geometry:
+  GrossVolume  profile area × depth
+  GrossArea    2 × profile area + perimeter × depth  (full surface incl. ends)
+  Length       longest edge of the world-axis bounding box, like the mesh
+               path (extrusions only – swept disks leave it to the mesh)
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import ifcopenshell
+import ifcopenshell.util.placement
+import ifcopenshell.util.unit
+
+# how an element's quantities were obtained
+ANALYTIC = "analytic"
+INSTANCED = "instanced"   # shared mesh of an IfcRepresentationMap
+MESH = "mesh"
+
+
+# ---------- profiles → (area, perimeter, outline points, outline radius) ----------
+def _polyline_points(curve) -> Optional[np.ndarray]:
+    """2D vertices of a straight-segment closed curve, else None."""
+    if curve is None:
+        return None
+    if curve.is_a("IfcPolyline"):
+        pts = np.array([p.Coordinates[:2] for p in curve.Points], dtype=float)
+    elif curve.is_a("IfcIndexedPolyCurve"):
+        coords = np.array(curve.Points.CoordList, dtype=float)[:, :2]
+        if curve.Segments:
+            if any(not seg.is_a("IfcLineIndex") for seg in curve.Segments):
+                return None  # arcs
+            idx = [i for seg in curve.Segments for i in seg.wrappedValue]
+            coords = coords[np.array(idx) - 1]  # 1-based, shared end points repeat
+            keep = np.r_[True, np.any(np.diff(coords, axis=0) != 0, axis=1)]
+            coords = coords[keep]
+        pts = coords
+    else:
+        return None
+    if len(pts) > 1 and np.allclose(pts[0], pts[-1]):
+        pts = pts[:-1]
+    return pts if len(pts) >= 3 else None
+
+
+def _polygon(pts: np.ndarray) -> Tuple[float, float]:
+    """Shoelace area and closed perimeter of a 2D polygon."""
+    x, y = pts[:, 0], pts[:, 1]
+    area = 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+    perim = float(np.linalg.norm(np.roll(pts, -1, axis=0) - pts, axis=1).sum())
+    return float(area), perim
+
+
+def _box(x: float, y: float) -> np.ndarray:
+    return np.array([[-x, -y], [x, -y], [x, y], [-x, y]], dtype=float) / 2
+
+
+def _profile_shape(profile) -> Optional[Tuple[float, float, np.ndarray, float]]:
+    cls = profile.is_a()
+    if cls == "IfcRectangleProfileDef":
+        x, y = profile.XDim, profile.YDim
+        return x * y, 2 * (x + y), _box(x, y), 0.0
+    if cls == "IfcRectangleHollowProfileDef":
+        if profile.InnerFilletRadius or profile.OuterFilletRadius:
+            return None
+        x, y, t = profile.XDim, profile.YDim, profile.WallThickness
+        return x * y - (x - 2 * t) * (y - 2 * t), 2 * (x + y) + 2 * (x + y - 4 * t), _box(x, y), 0.0
+    if cls == "IfcCircleProfileDef":
+        r = profile.Radius
+        return math.pi * r * r, 2 * math.pi * r, np.zeros((1, 2)), r
+    if cls == "IfcCircleHollowProfileDef":
+        r, t = profile.Radius, profile.WallThickness
+        return math.pi * (r * r - (r - t) ** 2), 2 * math.pi * (2 * r - t), np.zeros((1, 2)), r
+    if cls == "IfcIShapeProfileDef":
+        if profile.FilletRadius:
+            return None
+        b, h = profile.OverallWidth, profile.OverallDepth
+        tw, tf = profile.WebThickness, profile.FlangeThickness
+        return 2 * b * tf + (h - 2 * tf) * tw, 4 * b + 2 * h - 2 * tw, _box(b, h), 0.0
+    if cls in ("IfcArbitraryClosedProfileDef", "IfcArbitraryProfileDefWithVoids"):
+        outer = _polyline_points(profile.OuterCurve)
+        if outer is None:
+            return None
+        area, perim = _polygon(outer)
+        for inner in getattr(profile, "InnerCurves", None) or ():
+            pts = _polyline_points(inner)
+            if pts is None:
+                return None
+            a, p = _polygon(pts)
+            area, perim = area - a, perim + p
+        return area, perim, outer, 0.0
+    return None
+
+
+def profile_properties(profile) -> Optional[Tuple[float, float, np.ndarray, float]]:
+    """(area, perimeter, outline, radius) of a profile, else None.
+
+    The outline holds the 2D points spanning the profile's extent (corners,
+    polygon vertices or a circle centre) in the profile's parent frame; a
+    circle adds `radius` around each of them.
+    """
+    shape = _profile_shape(profile)
+    if shape is None:
+        return None
+    area, perim, pts, radius = shape
+    position = getattr(profile, "Position", None)
+    if position is not None:
+        m = ifcopenshell.util.placement.get_axis2placement(position)
+        pts = pts @ m[:2, :2].T + m[:2, 3]
+    return area, perim, pts, radius
+
+
+# ---------- solids → quantities in model units ----------
+def _world_extent(matrix: np.ndarray, pts: np.ndarray, radius: float) -> np.ndarray:
+    """World-axis bounding box size of 3D points in `matrix`'s frame, each
+    widened by a disk of `radius` lying in that frame's XY plane."""
+    rot = matrix[:3, :3]
+    ext = np.ptp(pts @ rot.T, axis=0)
+    if radius:
+        normal = rot[:, 2] / np.linalg.norm(rot[:, 2])
+        ext = ext + 2 * radius * np.sqrt(np.clip(1 - normal ** 2, 0.0, None))
+    return ext
+
+
+def _extrusion(item, placement: np.ndarray) -> Optional[Dict[str, float]]:
+    d = np.asarray(item.ExtrudedDirection.DirectionRatios, dtype=float)
+    if len(d) < 3 or not np.isclose(abs(d[2]) / np.linalg.norm(d), 1.0):
+        return None  # oblique extrusion: lateral area needs the mesh
+    props = profile_properties(item.SweptArea)
+    if props is None:
+        return None
+    area, perim, outline, radius = props
+    depth = item.Depth
+    if item.Position is not None:
+        placement = placement @ ifcopenshell.util.placement.get_axis2placement(item.Position)
+    base = np.c_[outline, np.zeros(len(outline))]
+    top = base + [0.0, 0.0, math.copysign(depth, d[2])]
+    return {
+        "GrossVolume": area * depth,
+        "GrossArea": 2 * area + perim * depth,
+        "Length": float(_world_extent(placement, np.r_[base, top], radius).max()),
+    }
+
+
+def _swept_disk(item) -> Optional[Dict[str, float]]:
+    if item.StartParam is not None or item.EndParam is not None:
+        return None
+    if not item.Directrix.is_a("IfcPolyline"):
+        return None
+    pts = np.array([p.Coordinates for p in item.Directrix.Points], dtype=float)
+    length = float(np.linalg.norm(np.diff(pts, axis=0), axis=1).sum())
+    r, ri = item.Radius, item.InnerRadius or 0.0
+    ring = math.pi * (r * r - ri * ri)
+    return {
+        "GrossVolume": ring * length,
+        "GrossArea": 2 * math.pi * (r + ri) * length + 2 * ring,
+    }
+
+
+def _body_item(element):
+    rep = getattr(element, "Representation", None)
+    if rep is None:
+        return None
+    bodies = [r for r in rep.Representations if r.RepresentationIdentifier == "Body"]
+    if len(bodies) != 1 or len(bodies[0].Items) != 1:
+        return None
+    return bodies[0].Items[0]
+
+
+def analytic_quantities(element, unit_scale: float = 1.0) -> Optional[Dict[str, float]]:
+    """GrossVolume/GrossArea[/Length] in SI, or None if the element needs the mesh path.
+
+    Length is only present where it matches the mesh definition (extrusions).
+    `unit_scale` converts model length units to metres
+    (ifcopenshell.util.unit.calculate_unit_scale).
+    """
+    if getattr(element, "HasOpenings", None):
+        return None  # the mesh has the openings subtracted – stay consistent
+    item = _body_item(element)
+    if item is None:
+        return None
+    if item.is_a() == "IfcExtrudedAreaSolid":  # not the tapered subtype
+        placement = np.eye(4)
+        if element.ObjectPlacement is not None:
+            placement = ifcopenshell.util.placement.get_local_placement(element.ObjectPlacement)
+        q = _extrusion(item, placement)
+    elif item.is_a() == "IfcSweptDiskSolid":
+        q = _swept_disk(item)
+    else:
+        return None
+    if q is None:
+        return None
+    dims = {"GrossVolume": 3, "GrossArea": 2, "Length": 1}
+    return {key: value * unit_scale ** dims[key] for key, value in q.items()}
+
+
+def unit_scale(model: ifcopenshell.file) -> float:
+    return ifcopenshell.util.unit.calculate_unit_scale(model)
+
+
+# mapping quantity kinds (Mapping-Qto page) that the analytic path can answer,
+# each with the same definition as MeshMetrics
+KIND_MAP = {
+    "VOLUME_NET": "GrossVolume",
+    "VOLUME_GROSS": "GrossVolume",
+    "AREA_SURF_TOTAL": "GrossArea",
+    "LENGTH_LONGEST": "Length",
+}
@@ -1,6 +1,11 @@
 # app.py
+import pandas as pd
 import streamlit as st
 
+from helpers import UPLOAD_TYPES, content_hash
+from prescan import prescan, recommendations
+from scratch import release
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  Page layout / title
 # ─────────────────────────────────────────────────────────────────────────────
@@ -19,21 +24,47 @@ st.markdown(
 # ─────────────────────────────────────────────────────────────────────────────
 uploaded = st.file_uploader(
     "Upload IFC",
-    type=("ifc"),
+    type=UPLOAD_TYPES,  # .ifc, .ifcZIP, .ifc.gz – kept compressed in the session
     #help="The file is kept in session; processing happens on the tool pages.",
 )
 
 if uploaded is not None:
-    # If the user changed the file name, reset session state
-    if st.session_state.get("ifc_name") != uploaded.name:
+    # Every new upload (file_id changes even for the same name) resets the
+    # session: model, prescan, hash and runs all belong to the old bytes
+    name = uploaded.name[:-3] if uploaded.name.lower().endswith(".gz") else uploaded.name  # a.ifc.gz → a.ifc
+    if st.session_state.get("ifc_file_id") != uploaded.file_id:
+        release(st.session_state)  # scratch files of the previous IFC
         st.session_state.clear()
-
-    st.session_state.ifc_name = uploaded.name
-    st.session_state.ifc_bytes = uploaded.getvalue()
+        st.session_state.ifc_file_id = uploaded.file_id
+        st.session_state.ifc_name = name
+        st.session_state.ifc_bytes = uploaded.getvalue()
+        st.session_state.ifc_sha256 = content_hash(st.session_state.ifc_bytes)
 
     st.success(
         f"Loaded **{uploaded.name}**. "
         ""
     )
+
+    # ─── pre-scan: header + entity census, no parse ───
+    if "prescan" not in st.session_state:
+        with st.spinner("Analysiere Datei …"):
+            st.session_state.prescan = prescan(st.session_state.ifc_bytes)
+    info = st.session_state.prescan
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Schema", info["schema"] or "?")
+    c2.metric("Entitäten", f"{info['instances']:,}".replace(",", "."))
+    c3.metric("Bauteile (IfcElement)", f"{info['elements']:,}".replace(",", "."))
+    c4.metric("Darstellungen", f"{info['representations']:,}".replace(",", "."))
+    st.caption(f"Erstellt mit: {info['tool'] or '–'} • Präprozessor: {info['preprocessor'] or '–'}")
+    for topic, hint in recommendations(info).items():
+        st.markdown(f"- **{topic}:** {hint}")
+
+    with st.expander("Entitäten je Typ"):
+        st.dataframe(
+            pd.DataFrame(info["counts"].most_common(), columns=["Typ", "Anzahl"]),
+            use_container_width=True,
+            height=400,
+        )
 else:
     st.info("👆 Upload IFC Datei.")
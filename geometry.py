@@ -0,0 +1,160 @@
+# geometry.py
+"""
+Mesh mass-properties shared by the Qto pages.
+
+All functions take a triangle mesh as
+    verts  (n, 3) float array
+    faces  (m, 3) int array of vertex indices
+and evaluate every triangle in one batched NumPy operation.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+DOWN_DOT_MIN = 0.8   # cos of max. tilt for a "bottom" face
+SIDE_DOT_MAX = 0.2   # |cos| to the z-axis below which a face counts as "side"
+
+
+# ---------- per-triangle primitives ----------
+def face_cross(verts: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """(m, 3) cross products (v1 - v0) × (v2 - v0); length = 2 × triangle area."""
+    tri = verts[faces]
+    return np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+
+
+def face_areas(verts: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    return 0.5 * np.linalg.norm(face_cross(verts, faces), axis=1)
+
+
+def face_normals(verts: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Unit face normals; degenerate triangles get a zero normal."""
+    n = face_cross(verts, faces)
+    return n / (np.linalg.norm(n, axis=1) + 1e-12)[:, None]
+
+
+# ---------- whole-mesh metrics ----------
+def signed_volume(verts: np.ndarray, faces: np.ndarray) -> float:
+    """Sum of signed tetrahedra wrt. the origin."""
+    tri = verts[faces]
+    return float(np.einsum("ij,ij->", tri[:, 0], np.cross(tri[:, 1], tri[:, 2])) / 6.0)
+
+
+def mesh_area_and_volume(verts: np.ndarray, faces: np.ndarray) -> Tuple[float, float]:
+    """Return (surface_area, volume) from a triangle mesh.
+    Volume via signed tetrahedra wrt origin (abs at end).
+    """
+    return float(face_areas(verts, faces).sum()), abs(signed_volume(verts, faces))
+
+
+def area_bottom(verts: np.ndarray, faces: np.ndarray) -> float:
+    """Area of all faces pointing (roughly) downwards."""
+    n = face_normals(verts, faces)
+    return float(face_areas(verts, faces)[-n[:, 2] > DOWN_DOT_MIN].sum())
+
+
+def area_side_max(verts: np.ndarray, faces: np.ndarray) -> float:
+    """Largest single (near-)vertical triangle."""
+    n = face_normals(verts, faces)
+    side = face_areas(verts, faces)[np.abs(n[:, 2]) < SIDE_DOT_MAX]
+    return float(side.max()) if side.size else 0.0
+
+
+# ---------- bounding box ----------
+def bbox_longest_edge(verts: np.ndarray) -> float:
+    return float(np.ptp(verts, axis=0).max())
+
+
+def bbox_height(verts: np.ndarray) -> float:
+    return float(np.ptp(verts[:, 2]))
+
+
+def bbox_diag_xy(verts: np.ndarray) -> float:
+    return float(np.linalg.norm(np.ptp(verts[:, :2], axis=0)))
+
+
+# ---------- lazy per-element evaluator ----------
+class MeshMetrics:
+    """Evaluate mapping quantity kinds (VOLUME_GROSS, AREA_BOTTOM, …) for one mesh.
+
+    Only requested kinds are computed; intermediates (cross products,
+    triangle areas, normals) are shared between kinds and every result is
+    memoized on the instance.
+    """
+
+    KINDS = (
+        "VOLUME_NET", "VOLUME_GROSS", "AREA_SURF_TOTAL", "AREA_BOTTOM",
+        "AREA_SIDE_MAX", "LENGTH_LONGEST", "LENGTH_XY", "HEIGHT_Z",
+    )
+
+    def __init__(self, verts: np.ndarray, faces: np.ndarray):
+        self.verts = verts
+        self.faces = faces
+        self._memo: dict = {}
+
+    def _cached(self, name, fn):
+        if name not in self._memo:
+            self._memo[name] = fn()
+        return self._memo[name]
+
+    # intermediates
+    @property
+    def cross(self) -> np.ndarray:
+        return self._cached("_cross", lambda: face_cross(self.verts, self.faces))
+
+    @property
+    def cross_norm(self) -> np.ndarray:
+        return self._cached("_cross_norm", lambda: np.linalg.norm(self.cross, axis=1))
+
+    @property
+    def areas(self) -> np.ndarray:
+        return self._cached("_areas", lambda: 0.5 * self.cross_norm)
+
+    @property
+    def normal_z(self) -> np.ndarray:
+        return self._cached("_normal_z", lambda: self.cross[:, 2] / (self.cross_norm + 1e-12))
+
+    @property
+    def extent(self) -> np.ndarray:
+        return self._cached("_extent", lambda: np.ptp(self.verts, axis=0))
+
+    # metric kinds
+    def _volume(self) -> float:
+        return abs(signed_volume(self.verts, self.faces))
+
+    def _area_side_max(self) -> float:
+        side = self.areas[np.abs(self.normal_z) < SIDE_DOT_MAX]
+        return float(side.max()) if side.size else 0.0
+
+    def _evaluators(self):
+        return {
+            "VOLUME_NET": self._volume,
+            "VOLUME_GROSS": self._volume,
+            "AREA_SURF_TOTAL": lambda: float(self.areas.sum()),
+            "AREA_BOTTOM": lambda: float(self.areas[-self.normal_z > DOWN_DOT_MIN].sum()),
+            "AREA_SIDE_MAX": self._area_side_max,
+            "LENGTH_LONGEST": lambda: float(self.extent.max()),
+            "LENGTH_XY": lambda: float(np.linalg.norm(self.extent[:2])),
+            "HEIGHT_Z": lambda: float(self.extent[2]),
+        }
+
+    def get(self, kind: str) -> Optional[float]:
+        """Value for `kind`, None for unknown kinds."""
+        if kind not in self.KINDS:
+            return None
+        key = "VOLUME_GROSS" if kind == "VOLUME_NET" else kind  # same mesh volume
+        return self._cached(key, self._evaluators()[key])
+
+    def instance(self, linear: np.ndarray) -> "MeshMetrics":
+        """Metrics of this mesh under a uniform-scale linear map (rotation, mirror, scale).
+
+        Volume and surface area are invariant up to the scale factor and are
+        carried over; orientation-dependent kinds (bbox, bottom/side areas) are
+        evaluated on the transformed vertices when requested.
+        """
+        inst = MeshMetrics(self.verts @ linear.T, self.faces)
+        s = abs(np.linalg.det(linear)) ** (1.0 / 3.0)
+        inst._memo["VOLUME_GROSS"] = float(self.get("VOLUME_GROSS") * s ** 3)
+        inst._memo["AREA_SURF_TOTAL"] = float(self.get("AREA_SURF_TOTAL") * s ** 2)
+        return inst
@@ -1,36 +1,46 @@
 # helpers.py
+import codecs
+import gzip
+import hashlib
+import io
+import os
+import shutil
 import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
 from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple
 
 import ifcopenshell
 import ifcopenshell.guid
 import pandas as pd
 
+from model_index import ModelIndex, bump_revision, classification_string, model_index, quantity_value
+from property_writer import PropertyWriter
+from scratch import scratch_path
+
 
 # ---------- classification ----------
-def get_classification_strings(element):
+def get_classification_strings(element, index: ModelIndex = None):
+    if index is not None:
+        return list(index.classifications.get(element.GlobalId, ()))
     out = []
     for rel in element.HasAssociations or []:
         if rel.is_a("IfcRelAssociatesClassification"):
             cls = rel.RelatingClassification
             if not cls:
                 continue
-            bits = []
-            for attr in ("ReferencedSource", "ClassificationSource"):
-                src = getattr(cls, attr, None)
-                if src and getattr(src, "Name", None):
-                    bits.append(src.Name)
-            if getattr(cls, "Name", None):
-                bits.append(cls.Name)
-            if getattr(cls, "Identification", None):
-                bits.append(cls.Identification)
-            if bits:
-                out.append(" : ".join(bits))
+            text = classification_string(cls)
+            if text:
+                out.append(text)
     return out
 
 
 # ---------- quantities ----------
-def get_quantity_dict(element):
+def get_quantity_dict(element, index: ModelIndex = None):
+    if index is not None:
+        return index.quantities(element.GlobalId)
     q = {}
     for rel in element.IsDefinedBy or []:
         if not rel.is_a("IfcRelDefinesByProperties"):
@@ -38,17 +48,16 @@ def get_quantity_dict(element):
         qset = rel.RelatingPropertyDefinition
         if qset and qset.is_a("IfcElementQuantity"):
             for quantity in qset.Quantities:
-                for attr in ("AreaValue", "VolumeValue", "LengthValue", "CountValue", "WeightValue"):
-                    if hasattr(quantity, attr):
-                        val = getattr(quantity, attr)
-                        if val is not None:
-                            q[quantity.Name] = val
-                        break
+                val = quantity_value(quantity)
+                if val is not None:
+                    q[quantity.Name] = val
     return q
 
 
 # ---------- custom P-set harvest ----------
-def get_pset_dict(element, pset_name):
+def get_pset_dict(element, pset_name, index: ModelIndex = None):
+    if index is not None:
+        return dict(index.pset(element.GlobalId, pset_name))
     out = {}
     for rel in element.IsDefinedBy or []:
         if not rel.is_a("IfcRelDefinesByProperties"):
@@ -64,6 +73,7 @@ def get_pset_dict(element, pset_name):
 
 # ---------- FULL extraction → DataFrame ----------
 def extract_ifc_to_dataframe(model, pset_name, split_classifications=False):
+    index = model_index(model)
     rows = []
     quantity_keys = set()
     pset_keys = set()
@@ -73,7 +83,7 @@ def extract_ifc_to_dataframe(model, pset_name, split_classifications=False):
         if not getattr(element, "GlobalId", None):
             continue
 
-        cls_list = get_classification_strings(element)
+        cls_list = get_classification_strings(element, index)
         if split_classifications:
             max_cls = max(max_cls, len(cls_list))
 
@@ -84,11 +94,11 @@ def extract_ifc_to_dataframe(model, pset_name, split_classifications=False):
             "classification": "; ".join(cls_list) if not split_classifications else cls_list,
         }
 
-        qdict = get_quantity_dict(element)
+        qdict = get_quantity_dict(element, index)
         row.update(qdict)
         quantity_keys.update(qdict.keys())
 
-        pdict = get_pset_dict(element, pset_name)
+        pdict = get_pset_dict(element, pset_name, index)
         row.update(pdict)
         pset_keys.update(pdict.keys())
 
@@ -114,19 +124,169 @@ def extract_ifc_to_dataframe(model, pset_name, split_classifications=False):
     return df
 
 
+# ---------- compressed uploads (.ifcZIP, .ifc.gz) ----------
+# Uploads stay compressed in session state; they are inflated chunk by
+# chunk only where the STEP text is actually needed.
+UPLOAD_TYPES = ("ifc", "ifczip", "gz")
+STREAM_CHUNK = 8 * 1024 * 1024
+
+
+def open_ifc_stream(byte_data) -> BinaryIO:
+    """Readable stream of the STEP text of a plain, .ifcZIP or gzip upload."""
+    head = bytes(byte_data[:4])
+    if head.startswith(b"PK\x03\x04"):
+        zf = zipfile.ZipFile(io.BytesIO(byte_data))
+        names = [n for n in zf.namelist() if n.lower().endswith(".ifc")]
+        if not names:
+            raise ValueError("Das ZIP-Archiv enthält keine .ifc-Datei.")
+        return zf.open(names[0])
+    if head.startswith(b"\x1f\x8b"):
+        return gzip.GzipFile(fileobj=io.BytesIO(byte_data))
+    return io.BytesIO(byte_data)
+
+
+def ifc_size(byte_data) -> int:
+    """Uncompressed size of an upload, read from the archive metadata."""
+    head = bytes(byte_data[:4])
+    if head.startswith(b"PK\x03\x04"):
+        zf = zipfile.ZipFile(io.BytesIO(byte_data))
+        return sum(i.file_size for i in zf.infolist() if i.filename.lower().endswith(".ifc"))
+    if head.startswith(b"\x1f\x8b"):
+        return int.from_bytes(bytes(byte_data[-4:]), "little")  # ISIZE (mod 2³²)
+    return len(byte_data)
+
+
+def read_ifc_text(byte_data) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    with open_ifc_stream(byte_data) as stream:
+        while chunk := stream.read(STREAM_CHUNK):
+            parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+# ---------- upload identity ----------
+def content_hash(byte_data) -> str:
+    """SHA-256 of the IFC content (decompressed); keys caches that must survive re-uploads."""
+    h = hashlib.sha256()
+    with open_ifc_stream(byte_data) as stream:
+        while chunk := stream.read(STREAM_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 # ---------- Write uploaded bytes to temp & load ----------
-def load_model_from_bytes(byte_data) -> ifcopenshell.file:
-    # we must write to disk; IfcOpenShell cannot open from raw bytes directly (unless using io in newer builds)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ifc")
-    tmp.write(byte_data)
-    tmp.flush()
+def write_ifc_file(byte_data, path) -> None:
+    """Write the (decompressed) STEP file of an upload to `path`."""
+    with open_ifc_stream(byte_data) as stream, open(path, "wb") as f:
+        shutil.copyfileobj(stream, f, STREAM_CHUNK)
+
+
+def bytes_to_tempfile(byte_data, suffix: str = ".ifc") -> str:
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
     tmp.close()
-    return ifcopenshell.open(tmp.name), tmp.name
+    write_ifc_file(byte_data, tmp.name)
+    return tmp.name
+
+
+def load_model_from_bytes(byte_data) -> ifcopenshell.file:
+    """Parse an uploaded IFC directly from memory (no temp file)."""
+    try:
+        return ifcopenshell.file.from_string(read_ifc_text(byte_data))
+    except (AttributeError, UnicodeDecodeError):
+        # older builds without from_string / non-UTF-8 exports → via disk
+        path = bytes_to_tempfile(byte_data)
+        try:
+            return ifcopenshell.open(path)
+        finally:
+            os.unlink(path)
+
+
+# ---------- process-wide parsed-model cache ----------
+# Sessions uploading the same file (same SHA-256) share one parsed model.
+# The budget is an estimate: a parsed model takes roughly
+# MODEL_MEMORY_FACTOR × its uncompressed file size in RAM.
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("RC2_MODEL_CACHE_MB", "4096")) * 1024 * 1024
+MODEL_MEMORY_FACTOR = 8
+
+_models: "OrderedDict[str, tuple]" = OrderedDict()  # sha256 → (model, estimated bytes)
+_models_lock = threading.Lock()
+_parsing: dict = {}  # sha256 → lock, so concurrent sessions parse a file only once
+
+
+def shared_model(byte_data, sha256: str = None) -> ifcopenshell.file:
+    """Parsed model for `byte_data` from the process-wide LRU cache.
+
+    The returned model is shared between sessions – treat it as read-only
+    (see session_model for a private, writable copy).
+    """
+    sha256 = sha256 or content_hash(byte_data)
+    with _models_lock:
+        if sha256 in _models:
+            _models.move_to_end(sha256)
+            return _models[sha256][0]
+        parse_lock = _parsing.setdefault(sha256, threading.Lock())
+
+    with parse_lock:
+        with _models_lock:
+            if sha256 in _models:  # parsed by another session meanwhile
+                _models.move_to_end(sha256)
+                return _models[sha256][0]
+        model = load_model_from_bytes(byte_data)
+        size = ifc_size(byte_data) * MODEL_MEMORY_FACTOR
+        with _models_lock:
+            _parsing.pop(sha256, None)
+            if size <= MODEL_CACHE_MAX_BYTES:
+                _models[sha256] = (model, size)
+                total = sum(s for _, s in _models.values())
+                while total > MODEL_CACHE_MAX_BYTES:
+                    _, (_, evicted) = _models.popitem(last=False)  # least recently used
+                    total -= evicted
+    return model
 
 
+def session_model(state, writable: bool = False) -> ifcopenshell.file:
+    """The model of this session (st.session_state), loaded on first use.
+
+    Read-only pages get the shared cached model. Pages that modify the model
+    pass writable=True and get a private copy on first write (copy-on-write);
+    it stays in the session so later pages see the changes.
+    """
+    model = state.get("model")
+    if model is None:
+        model = shared_model(state["ifc_bytes"], state.get("ifc_sha256"))
+        state["model"] = model
+        state["model_shared"] = True
+    if writable and state.get("model_shared"):
+        model = load_model_from_bytes(state["ifc_bytes"])
+        state["model"] = model
+        state["model_shared"] = False
+    return model
 
-def _get_gross_volume(element):
+
+def ifc_path_for(state) -> str:
+    """On-disk copy of the uploaded IFC (st.session_state), written once per session.
+
+    For tools that need a file path, e.g. the isolated tessellation workers.
+    """
+    path = state.get("ifc_path")
+    if not path or not Path(path).exists():
+        path = scratch_path(state, "upload.ifc")
+        write_ifc_file(state["ifc_bytes"], path)
+        state["ifc_path"] = path
+    return path
+
+
+
+def _get_gross_volume(element, index: ModelIndex = None):
     """Return GrossVolume if present, else None."""
+    if index is not None:
+        for qset in index.qtos.get(element.GlobalId, {}).values():
+            for name, (val, _) in qset.items():
+                if name.lower() == "grossvolume":
+                    return val
+        return None
     for rel in element.IsDefinedBy or []:
         if not rel.is_a("IfcRelDefinesByProperties"):
             continue
@@ -138,7 +298,170 @@ def _get_gross_volume(element):
     return None
 
 
-def add_rc2_pset(model, prüfung_flag: bool = True):
+# ---------- shared property sets ----------
+# payload of one property: (IFC value type, value) for plain single values,
+# ("#", entity id) for anything else – those are kept as they are
+PropSpec = Tuple[str, object]
+
+
+def _pset_rels(elem, pset_name: str) -> list:
+    return [
+        rel for rel in elem.IsDefinedBy or []
+        if rel.is_a("IfcRelDefinesByProperties")
+        and rel.RelatingPropertyDefinition.is_a("IfcPropertySet")
+        and rel.RelatingPropertyDefinition.Name == pset_name
+    ]
+
+
+def _pset_payload(pset) -> Dict[str, PropSpec]:
+    out = {}
+    for p in pset.HasProperties or ():
+        if p.is_a("IfcPropertySingleValue") and p.Unit is None:
+            nv = p.NominalValue
+            out[p.Name] = (nv.is_a(), nv.wrappedValue) if nv is not None else ("", None)
+        else:
+            out[p.Name] = ("#", p.id())
+    return out
+
+
+def _create_property(model, name: str, spec: PropSpec):
+    kind, value = spec
+    if kind == "#":
+        return model.by_id(value)
+    return model.createIfcPropertySingleValue(
+        Name=name,
+        Description=None,
+        NominalValue=model.create_entity(kind, value) if kind else None,
+        Unit=None,
+    )
+
+
+def _copy_entity(model, entity):
+    info = entity.get_info(recursive=False)
+    return model.create_entity(entity.is_a(), **{k: v for k, v in info.items() if k not in ("id", "type")})
+
+
+def own_pset(model, elem, pset_name: str):
+    """The element's P-set `pset_name`, created if missing, never shared with other elements.
+
+    A P-set related to further elements (e.g. by write_shared_psets) is
+    copied first and the element moved to the copy (copy-on-write), so
+    in-place edits only ever affect `elem`.
+    """
+    rels = _pset_rels(elem, pset_name)
+    if rels:
+        rel = rels[0]
+        pset = rel.RelatingPropertyDefinition
+        users = sum(len(r.RelatedObjects) for r in model.get_inverse(pset) if r.is_a("IfcRelDefinesByProperties"))
+        if users <= 1:
+            return pset
+        pset = model.createIfcPropertySet(
+            GlobalId=ifcopenshell.guid.new(),
+            OwnerHistory=pset.OwnerHistory,
+            Name=pset.Name,
+            Description=pset.Description,
+            HasProperties=[_copy_entity(model, p) for p in pset.HasProperties or ()],
+        )
+        rel.RelatedObjects = [o for o in rel.RelatedObjects if o != elem]
+        if not rel.RelatedObjects:  # element was the only one of this relation
+            model.remove(rel)
+    else:
+        pset = model.createIfcPropertySet(
+            GlobalId=ifcopenshell.guid.new(),
+            OwnerHistory=None,
+            Name=pset_name,
+            Description=None,
+            HasProperties=(),
+        )
+    model.createIfcRelDefinesByProperties(
+        GlobalId=ifcopenshell.guid.new(),
+        OwnerHistory=None,
+        Name=None,
+        Description=None,
+        RelatedObjects=[elem],
+        RelatingPropertyDefinition=pset,
+    )
+    return pset
+
+
+def write_shared_psets(model, pset_name: str, updates: Dict[object, Dict[str, PropSpec]]) -> int:
+    """Write property values so that elements with identical values share one P-set.
+
+    `updates` maps element → {property name: (IFC type, value)}. The payload of
+    an element is its current `pset_name` values overlaid with its updates;
+    elements are grouped by payload and every group gets one IfcPropertySet
+    plus one IfcRelDefinesByProperties relating all of them. A P-set that
+    already carries a group's payload is reused, P-sets left without
+    elements are removed. Returns the number of P-sets in use afterwards.
+    """
+    groups: Dict[tuple, List[object]] = {}
+    members: Dict[int, list] = {}   # rel id → RelatedObjects after the write
+    rels: Dict[int, object] = {}
+    existing: Dict[tuple, object] = {}  # payload → rel of an existing P-set
+
+    for elem, values in updates.items():
+        current: Dict[str, PropSpec] = {}
+        for rel in _pset_rels(elem, pset_name):
+            if rel.id() not in rels:
+                rels[rel.id()] = rel
+                members[rel.id()] = list(rel.RelatedObjects)
+                key = tuple(sorted(_pset_payload(rel.RelatingPropertyDefinition).items()))
+                existing.setdefault(key, rel)
+            current = {**_pset_payload(rel.RelatingPropertyDefinition), **current}  # first P-set wins
+            members[rel.id()].remove(elem)
+        key = tuple(sorted({**current, **values}.items()))
+        groups.setdefault(key, []).append(elem)
+
+    for key, elems in groups.items():
+        rel = existing.get(key)
+        if rel is not None:
+            members[rel.id()] += elems
+            continue
+        pset = model.createIfcPropertySet(
+            GlobalId=ifcopenshell.guid.new(),
+            OwnerHistory=None,
+            Name=pset_name,
+            Description=None,
+            HasProperties=[_create_property(model, name, spec) for name, spec in key],
+        )
+        model.createIfcRelDefinesByProperties(
+            GlobalId=ifcopenshell.guid.new(),
+            OwnerHistory=None,
+            Name=None,
+            Description=None,
+            RelatedObjects=elems,
+            RelatingPropertyDefinition=pset,
+        )
+
+    # assign RelatedObjects once per touched relation, drop emptied ones
+    for rid, rel in rels.items():
+        objs = members[rid]
+        if objs:
+            if len(objs) != len(rel.RelatedObjects) or set(objs) != set(rel.RelatedObjects):
+                rel.RelatedObjects = objs
+            continue
+        pset = rel.RelatingPropertyDefinition
+        model.remove(rel)
+        if model.get_total_inverses(pset) == 0:
+            props = list(pset.HasProperties or ())
+            model.remove(pset)
+            for prop in props:
+                if model.get_total_inverses(prop) == 0:
+                    model.remove(prop)
+
+    return len(groups)
+
+
+def rc2_values(prüfung_flag: bool, cls_list: List[str], gross_vol) -> Dict[str, PropSpec]:
+    """Pruefung / Position_n / Menge_n payload of one element."""
+    values: Dict[str, PropSpec] = {"Pruefung": ("IfcBoolean", prüfung_flag)}
+    for idx, cls_txt in enumerate(cls_list, start=1):
+        values[f"Position_{idx}"] = ("IfcLabel", cls_txt)
+        values[f"Menge_{idx}"] = ("IfcVolumeMeasure", gross_vol if gross_vol is not None else 0.0)
+    return values
+
+
+def add_rc2_pset(model, prüfung_flag: bool = True, shared: bool = False):
     """
     Adds / updates P‑set **Oebb_RC2** on every physical element.
 
@@ -146,72 +469,34 @@ def add_rc2_pset(model, prüfung_flag: bool = True):
     • Position_1..n (LABEL)     ← classification strings
     • Menge_1..n    (VOLUME)    ← GrossVolume value (copied)
 
+    shared=True → elements with identical values share one P‑set (see
+    write_shared_psets) instead of getting one P‑set each.
     """
     PSET_NAME = "Oebb_RC2"
+    index = model_index(model)  # reads only classifications/quantities – unaffected by the writes below
+
+    if shared:
+        updates = {
+            elem: rc2_values(prüfung_flag, get_classification_strings(elem, index), _get_gross_volume(elem, index))
+            for elem in model.by_type("IfcProduct")
+            if getattr(elem, "GlobalId", None)
+        }
+        write_shared_psets(model, PSET_NAME, updates)
+        bump_revision(model)
+        return model
 
     for elem in model.by_type("IfcProduct"):
         if not getattr(elem, "GlobalId", None):
             continue
 
-        # --------------------- find or create the P‑set ---------------------
-        pset = None
-        for rel in elem.IsDefinedBy or []:
-            if rel.is_a("IfcRelDefinesByProperties"):
-                obj = rel.RelatingPropertyDefinition
-                if obj.is_a("IfcPropertySet") and obj.Name == PSET_NAME:
-                    pset = obj
-                    break
-
-        if pset is None:
-            pset = model.createIfcPropertySet(
-                GlobalId=ifcopenshell.guid.new(),
-                OwnerHistory=None,
-                Name=PSET_NAME,
-                Description=None,
-                HasProperties=(),
-            )
-            model.createIfcRelDefinesByProperties(
-                GlobalId=ifcopenshell.guid.new(),
-                OwnerHistory=None,
-                Name=None,
-                Description=None,
-                RelatedObjects=[elem],
-                RelatingPropertyDefinition=pset,
-            )
-
-        # helper to add / update a single property in that P‑set
-        def upsert(name: str, nominal_value):
-            existing = next((p for p in pset.HasProperties if p.Name == name), None)
-            if existing:
-                existing.NominalValue.wrappedValue = nominal_value
-            else:
-                new_prop = model.createIfcPropertySingleValue(
-                    Name=name,
-                    Description=None,
-                    NominalValue=nominal_value,
-                    Unit=None,
-                )
-                # tuples are immutable → re‑assign
-                pset.HasProperties = pset.HasProperties + (new_prop,)
-
-        # --------------------- 1) boolean Pruefung --------------------------
-        upsert(
-            "Pruefung",
-            model.create_entity("IfcBoolean", prüfung_flag),
-        )
-
-        # --------------------- 2) classifications → Position_n --------------
-        cls_list = get_classification_strings(elem)
-        gross_vol = _get_gross_volume(elem)
+        # --------------------- find or create the P‑set (own copy if shared) ----
+        pset = own_pset(model, elem, PSET_NAME)
 
-        for idx, cls_txt in enumerate(cls_list, start=1):
-            upsert(
-                f"Position_{idx}",
-                model.create_entity("IfcLabel", cls_txt),
-            )
-            upsert(
-                f"Menge_{idx}",
-                model.create_entity("IfcVolumeMeasure", gross_vol if gross_vol is not None else 0.0),
-            )
+        # --------------------- Pruefung + classifications → Position_n / Menge_n
+        values = rc2_values(prüfung_flag, get_classification_strings(elem, index), _get_gross_volume(elem, index))
+        with PropertyWriter(model, pset) as props:
+            for name, (kind, value) in values.items():
+                props.single_value(name, value, kind)
 
+    bump_revision(model)
     return model
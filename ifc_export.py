@@ -0,0 +1,55 @@
+# ifc_export.py
+"""
+In-memory IFC serialization for the download buttons.
+
+The STEP text comes straight from model.to_string() – no temp file, no
+read-back. Plain downloads hand that str to Streamlit as is; with
+`zipped=True` it is encoded and deflated chunk by chunk into an .ifcZIP
+container, so next to the text only the compressed bytes are held.
+Download buttons serialize lazily: only when the user actually clicks.
+"""
+from __future__ import annotations
+
+import io
+import zipfile
+from pathlib import Path
+
+import ifcopenshell
+import streamlit as st
+
+CHUNK_CHARS = 8 * 1024 * 1024
+IFC_MIME = "application/octet-stream"
+IFCZIP_MIME = "application/zip"
+
+
+def download_name(file_name: str, zipped: bool = False) -> str:
+    """'model_with_qto.ifc' → 'model_with_qto.ifcZIP' when zipped."""
+    return str(Path(file_name).with_suffix(".ifcZIP")) if zipped else file_name
+
+
+def serialize_ifc(model: ifcopenshell.file, zipped: bool = False, inner_name: str = "model.ifc") -> str | bytes:
+    """STEP text of `model` (str), or .ifcZIP bytes with one entry `inner_name`."""
+    text = model.to_string()
+    if not zipped:
+        return text  # st.download_button encodes str as UTF-8
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        with zf.open(inner_name, "w", force_zip64=True) as out:
+            for i in range(0, len(text), CHUNK_CHARS):
+                out.write(text[i:i + CHUNK_CHARS].encode("utf-8"))
+    return buf.getvalue()
+
+
+def ifc_download_button(label: str, model: ifcopenshell.file, file_name: str, zipped: bool = False, **kwargs) -> bool:
+    """st.download_button that serializes `model` only when clicked.
+
+    Streamlit runs the serializer on its own thread while the rerun triggered
+    by the click executes – that rerun must not write to `model`.
+    """
+    return st.download_button(
+        label,
+        lambda: serialize_ifc(model, zipped, inner_name=Path(file_name).with_suffix(".ifc").name),
+        file_name=download_name(file_name, zipped),
+        mime=IFCZIP_MIME if zipped else IFC_MIME,
+        **kwargs,
+    )
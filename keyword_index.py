@@ -0,0 +1,121 @@
+# keyword_index.py
+"""
+Inverted token / character-n-gram index over normalized catalog keywords.
+
+Shortlists the keywords worth scoring for a text blob, so fuzzy matching
+costs grow with the number of overlapping keywords instead of the catalog
+size:
+
+    idx = KeywordIndex(kw_list)
+    cand = idx.candidates("basiswand stb 25")   # sorted positions in kw_list
+    best_idx, best_score = best_matches(blobs, kw_list, idx)
+
+A candidate list holds
+• every keyword sharing a whole token with the blob, and
+• the SHORTLIST keywords sharing the most character n-grams (of the
+  space-padded tokens), n-grams occurring in more than MAX_GRAM_SHARE of
+  all keywords are not indexed.
+
+Every keyword that can reach token_set_ratio 100 shares a token with the
+blob, so a shortlist scoring 100 has the same best match as a full scan.
+best_matches(exact=True) skips the shortlist and runs the full scan.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+NGRAM = 3
+SHORTLIST = 50
+MAX_GRAM_SHARE = 0.1  # n-grams in more keywords than this share carry no signal
+MATCH_CHUNK = 2048  # blobs per cdist call → score block ≤ MATCH_CHUNK × len(keywords) float64
+
+
+def _grams(text: str, n: int = NGRAM) -> set:
+    out = set()
+    for token in text.split():
+        padded = f" {token} "
+        out.update(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return out
+
+
+def _postings(table: Dict[str, List[int]]) -> Dict[str, np.ndarray]:
+    return {key: np.asarray(ids, dtype=np.int64) for key, ids in table.items()}
+
+
+class KeywordIndex:
+    """Token and n-gram postings of a keyword list (positions into that list)."""
+
+    def __init__(self, keywords: List[str], shortlist: int = SHORTLIST):
+        self.size = len(keywords)
+        self.shortlist = shortlist
+        tokens: Dict[str, List[int]] = {}
+        grams: Dict[str, List[int]] = {}
+        for i, kw in enumerate(keywords):
+            for token in set(kw.split()):
+                tokens.setdefault(token, []).append(i)
+            for gram in _grams(kw):
+                grams.setdefault(gram, []).append(i)
+        max_df = max(SHORTLIST, int(self.size * MAX_GRAM_SHARE))
+        self._tokens = _postings(tokens)
+        self._grams = _postings({g: ids for g, ids in grams.items() if len(ids) <= max_df})
+
+    def candidates(self, blob: str) -> np.ndarray:
+        """Sorted keyword positions worth scoring against `blob` (may be empty)."""
+        empty = np.empty(0, dtype=np.int64)
+        by_token = [self._tokens[t] for t in set(blob.split()) if t in self._tokens]
+        by_gram = [self._grams[g] for g in _grams(blob) if g in self._grams]
+        shared = np.concatenate(by_token) if by_token else empty
+        if by_gram:
+            ids, counts = np.unique(np.concatenate(by_gram), return_counts=True)
+            if len(ids) > self.shortlist:
+                ids = ids[np.argpartition(-counts, self.shortlist)[: self.shortlist]]
+            shared = np.concatenate([shared, ids])
+        return np.unique(shared)
+
+
+# ---------- matching ----------
+def full_scan(blobs: List[str], keywords: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of the best keyword and its token_set_ratio for every blob.
+
+    Scores all blobs against all keywords with process.cdist on all cores;
+    ties go to the first keyword, like process.extractOne.
+    """
+    best_idx = np.zeros(len(blobs), dtype=np.int64)
+    best_score = np.zeros(len(blobs), dtype=np.float64)
+    if not keywords:
+        return best_idx, best_score
+    if (os.cpu_count() or 1) == 1:
+        # one core: extractOne prunes with the running best score and beats the full matrix
+        for i, blob in enumerate(blobs):
+            _, best_score[i], best_idx[i] = process.extractOne(blob, keywords, scorer=fuzz.token_set_ratio)
+        return best_idx, best_score
+    for start in range(0, len(blobs), MATCH_CHUNK):
+        scores = process.cdist(
+            blobs[start:start + MATCH_CHUNK], keywords, scorer=fuzz.token_set_ratio, dtype=np.float64, workers=-1
+        )
+        best_idx[start:start + len(scores)] = scores.argmax(axis=1)
+        best_score[start:start + len(scores)] = scores.max(axis=1)
+    return best_idx, best_score
+
+
+def best_matches(blobs: List[str], keywords: List[str], index: Optional[KeywordIndex] = None,
+                 exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Like full_scan, but only keywords shortlisted by `index` are scored.
+
+    exact=True (or no index) → full_scan: most blobs score below 100 on their
+    shortlist and would need the full scan anyway.
+    """
+    if index is None or exact:
+        return full_scan(blobs, keywords)
+    best_idx = np.zeros(len(blobs), dtype=np.int64)
+    best_score = np.zeros(len(blobs), dtype=np.float64)
+    for i, blob in enumerate(blobs):
+        cand = index.candidates(blob)
+        if len(cand):
+            _, best_score[i], j = process.extractOne(blob, [keywords[c] for c in cand], scorer=fuzz.token_set_ratio)
+            best_idx[i] = cand[j]
+    return best_idx, best_score
@@ -0,0 +1,159 @@
+# mesh_cache.py
+"""
+Persistent on-disk cache of tessellated meshes.
+
+Layout (one entry per model content hash × geometry settings):
+
+    <CACHE_DIR>/<model sha256>/<settings fingerprint>/
+        <chunk>.verts.npy   float32 (n, 3), vertices relative to a per-element origin
+        <chunk>.faces.npy   int32   (m, 3)
+        <chunk>.json        {guid: [v0, v1, f0, f1, ox, oy, oz]}
+        .used               touched on every open → LRU order
+
+Each tessellation run that produced new meshes appends one chunk; arrays
+are opened with mmap_mode="r", so only the meshes actually read are paged in.
+Vertices are stored relative to the element's bbox minimum (kept as float64
+in the index) so float32 keeps sub-millimetre precision even for
+project coordinates in the millions.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import ifcopenshell
+import ifcopenshell.geom
+
+CACHE_DIR = Path(os.environ.get("RC2_MESH_CACHE_DIR", Path.home() / ".cache" / "demo_rc2_ifc" / "meshes"))
+CACHE_MAX_BYTES = int(os.environ.get("RC2_MESH_CACHE_MB", "2048")) * 1024 * 1024
+
+
+def settings_fingerprint(settings: ifcopenshell.geom.settings) -> str:
+    """Short hash over all readable geometry settings + IfcOpenShell version."""
+    values = []
+    for name in settings.setting_names():
+        try:
+            values.append((name, settings.get(name)))
+        except Exception:
+            pass  # unset optional settings raise
+    return hashlib.sha1(repr((ifcopenshell.version, values)).encode()).hexdigest()[:16]
+
+
+class MeshCache:
+    """Meshes of one model (content hash) under one settings fingerprint."""
+
+    def __init__(
+        self,
+        model_hash: str,
+        settings: ifcopenshell.geom.settings,
+        root: Path = CACHE_DIR,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.dir = self.root / model_hash / settings_fingerprint(settings)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        (self.dir / ".used").touch()
+        self._index: Dict[str, Tuple[str, list]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        for idx_file in sorted(self.dir.glob("*.json")):
+            try:
+                entries = json.loads(idx_file.read_text())
+            except (OSError, ValueError):
+                continue  # half-written chunk of a crashed run
+            chunk = idx_file.stem
+            self._index.update({guid: (chunk, e) for guid, e in entries.items()})
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._index or guid in self._pending
+
+    def _chunk(self, chunk: str) -> Tuple[np.ndarray, np.ndarray]:
+        if chunk not in self._arrays:
+            self._arrays[chunk] = (
+                np.load(self.dir / f"{chunk}.verts.npy", mmap_mode="r"),
+                np.load(self.dir / f"{chunk}.faces.npy", mmap_mode="r"),
+            )
+        return self._arrays[chunk]
+
+    def get(self, guid: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return (verts float64, faces int) or None if not cached."""
+        if guid in self._pending:
+            local, origin, faces = self._pending[guid]
+            return local + origin, faces.astype(int)
+        hit = self._index.get(guid)
+        if hit is None:
+            return None
+        chunk, (v0, v1, f0, f1, *origin) = hit
+        try:
+            verts, faces = self._chunk(chunk)
+        except (OSError, ValueError):
+            return None
+        return verts[v0:v1].astype(float) + np.asarray(origin), faces[f0:f1].astype(int)
+
+    def put(self, guid: str, verts: np.ndarray, faces: np.ndarray) -> None:
+        """Queue a mesh for the next flush; an empty mesh records "no geometry"."""
+        origin = verts.min(axis=0) if len(verts) else np.zeros(3)
+        self._pending[guid] = (
+            (verts - origin).astype(np.float32),
+            origin,
+            np.asarray(faces, dtype=np.int32),
+        )
+
+    def flush(self) -> None:
+        """Write pending meshes as one new chunk, then enforce the size budget."""
+        if not self._pending:
+            return
+        chunk = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        self.dir.mkdir(parents=True, exist_ok=True)  # may have been evicted by another session
+        entries, v_parts, f_parts = {}, [], []
+        v_off = f_off = 0
+        for guid, (local, origin, faces) in self._pending.items():
+            entries[guid] = [v_off, v_off + len(local), f_off, f_off + len(faces), *map(float, origin)]
+            v_off += len(local)
+            f_off += len(faces)
+            v_parts.append(local)
+            f_parts.append(faces)
+        np.save(self.dir / f"{chunk}.verts.npy", np.concatenate(v_parts).reshape(-1, 3))
+        np.save(self.dir / f"{chunk}.faces.npy", np.concatenate(f_parts).reshape(-1, 3))
+        # index last: a chunk only becomes visible once its arrays are complete
+        tmp = self.dir / f"{chunk}.json.tmp"
+        tmp.write_text(json.dumps(entries))
+        os.replace(tmp, self.dir / f"{chunk}.json")
+        self._index.update({guid: (chunk, e) for guid, e in entries.items()})
+        self._pending.clear()
+        evict(self.root, self.max_bytes, keep=self.dir)
+
+
+def _entry_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def evict(root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, keep: Optional[Path] = None) -> None:
+    """Delete least recently used cache entries until the total fits `max_bytes`."""
+    entries = []
+    for model_dir in Path(root).glob("*"):
+        for entry in model_dir.glob("*"):
+            if entry.is_dir():
+                used = entry / ".used"
+                entries.append((used.stat().st_mtime if used.exists() else 0.0, entry, _entry_size(entry)))
+    total = sum(size for _, _, size in entries)
+    for _, entry, size in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        try:
+            entry.parent.rmdir()  # only succeeds once the model has no entries left
+        except OSError:
+            pass
+
@@ -0,0 +1,175 @@
+# model_index.py
+"""
+One-pass relationship index: GUID → psets / qtos / classifications.
+
+Built from a single scan over all IfcRelDefinesByProperties and
+IfcRelAssociatesClassification instead of walking IsDefinedBy /
+HasAssociations per element (and often several times per element).
+
+    idx = model_index(model)
+    idx.psets[guid]["Pset_WallCommon"]["IsExternal"]     → value
+    idx.qtos[guid]["Qto_WallBaseQuantities"]["Length"]   → (value, unit entity)
+    idx.classifications[guid]                            → ["RC2 : Wand : 1.1", …]
+
+    container_catalogue(model)["Pset"]["Pset_WallCommon"] → sorted property names
+
+Property/quantity dicts of one definition are shared by all elements it is
+related to – treat everything as read-only.
+
+Both are cached per model and *revision*. Pages that modify a model call
+bump_revision(model) afterwards; the next model_index() / container_catalogue()
+call rebuilds, every other call (e.g. a Streamlit rerun) is a dict lookup.
+"""
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Callable, Dict, List, Tuple
+
+import ifcopenshell
+
+QUANTITY_ATTRS = ("AreaValue", "VolumeValue", "LengthValue", "CountValue", "WeightValue")
+
+_revisions: "weakref.WeakKeyDictionary[ifcopenshell.file, int]" = weakref.WeakKeyDictionary()
+_derived: "weakref.WeakKeyDictionary[ifcopenshell.file, Dict[str, Tuple[int, object]]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def classification_string(cls) -> str:
+    """'Source : Name : Identification' of a classification (reference), '' if empty."""
+    bits = []
+    for attr in ("ReferencedSource", "ClassificationSource"):
+        src = getattr(cls, attr, None)
+        if src and getattr(src, "Name", None):
+            bits.append(src.Name)
+    if getattr(cls, "Name", None):
+        bits.append(cls.Name)
+    if getattr(cls, "Identification", None):
+        bits.append(cls.Identification)
+    return " : ".join(bits)
+
+
+def quantity_value(quantity):
+    """Value of an IfcPhysicalSimpleQuantity (first *Value attribute it has)."""
+    for attr in QUANTITY_ATTRS:
+        if hasattr(quantity, attr):
+            return getattr(quantity, attr)
+    return None
+
+
+class ModelIndex:
+    """GUID-keyed views of the property, quantity and classification relations."""
+
+    def __init__(self, model: ifcopenshell.file):
+        self.psets: Dict[str, Dict[str, Dict[str, object]]] = {}
+        self.qtos: Dict[str, Dict[str, Dict[str, Tuple[object, object]]]] = {}
+        self.classifications: Dict[str, List[str]] = {}
+        self.classification_refs: Dict[str, List[object]] = {}
+
+        for rel in model.by_type("IfcRelDefinesByProperties"):
+            pdef = rel.RelatingPropertyDefinition
+            if pdef is None:
+                continue
+            name = pdef.Name or ""
+            if pdef.is_a("IfcPropertySet"):
+                props = {
+                    p.Name: (p.NominalValue.wrappedValue if p.NominalValue else None)
+                    for p in pdef.HasProperties or ()
+                    if p.is_a("IfcPropertySingleValue")
+                }
+                target = self.psets
+            elif pdef.is_a("IfcElementQuantity"):
+                props = {q.Name: (quantity_value(q), getattr(q, "Unit", None)) for q in pdef.Quantities or ()}
+                target = self.qtos
+            else:
+                continue
+            for obj in rel.RelatedObjects or ():
+                guid = getattr(obj, "GlobalId", None)
+                if not guid:
+                    continue
+                sets = target.setdefault(guid, {})
+                if name in sets:  # same name twice on one element → merge (first value wins)
+                    sets[name] = {**props, **sets[name]}
+                else:
+                    sets[name] = props
+
+        for rel in model.by_type("IfcRelAssociatesClassification"):
+            cls = rel.RelatingClassification
+            if not cls:
+                continue
+            text = classification_string(cls)
+            for obj in rel.RelatedObjects or ():
+                guid = getattr(obj, "GlobalId", None)
+                if not guid:
+                    continue
+                self.classification_refs.setdefault(guid, []).append(cls)
+                if text:
+                    self.classifications.setdefault(guid, []).append(text)
+
+    # ---------- lookups ----------
+    def pset(self, guid: str, name: str) -> Dict[str, object]:
+        return self.psets.get(guid, {}).get(name, {})
+
+    def qto(self, guid: str, name: str) -> Dict[str, Tuple[object, object]]:
+        return self.qtos.get(guid, {}).get(name, {})
+
+    def quantities(self, guid: str) -> Dict[str, object]:
+        """All quantities of all qtos merged (later sets win), None values skipped."""
+        out = {}
+        for qset in self.qtos.get(guid, {}).values():
+            out.update({n: v for n, (v, _) in qset.items() if v is not None})
+        return out
+
+    def has_qto(self, guid: str) -> bool:
+        return bool(self.qtos.get(guid))
+
+
+def revision(model: ifcopenshell.file) -> int:
+    return _revisions.get(model, 0)
+
+
+def bump_revision(model: ifcopenshell.file) -> int:
+    """Mark `model` as modified; cached indexes/catalogues of it become stale."""
+    with _lock:
+        _revisions[model] = _revisions.get(model, 0) + 1
+        return _revisions[model]
+
+
+def _cached(model: ifcopenshell.file, key: str, build: Callable[[ifcopenshell.file], object]):
+    """Value derived from `model`, rebuilt only when its revision changed."""
+    rev = revision(model)
+    cached = _derived.get(model, {}).get(key)
+    if cached is not None and cached[0] == rev:
+        return cached[1]
+    value = build(model)
+    with _lock:
+        _derived.setdefault(model, {})[key] = (rev, value)
+    return value
+
+
+def model_index(model: ifcopenshell.file) -> ModelIndex:
+    """Index of `model` at its current revision (built on first use)."""
+    return _cached(model, "index", ModelIndex)
+
+
+def _build_catalogue(model: ifcopenshell.file) -> Dict[str, Dict[str, List[str]]]:
+    fields: Dict[str, Dict[str, set]] = {"Pset": {}, "Qto": {}}
+    seen = set()
+    for rel in model.by_type("IfcRelDefinesByProperties"):
+        pdef = rel.RelatingPropertyDefinition
+        if pdef is None or not pdef.Name or pdef.id() in seen:
+            continue
+        seen.add(pdef.id())  # shared definitions are read once
+        if pdef.is_a("IfcPropertySet"):
+            items, kind = pdef.HasProperties, "Pset"
+        elif pdef.is_a("IfcElementQuantity"):
+            items, kind = pdef.Quantities, "Qto"
+        else:
+            continue
+        fields[kind].setdefault(pdef.Name, set()).update(i.Name for i in items or () if i.Name)
+    return {kind: {n: sorted(f) for n, f in sorted(names.items())} for kind, names in fields.items()}
+
+
+def container_catalogue(model: ifcopenshell.file) -> Dict[str, Dict[str, List[str]]]:
+    """{"Pset": {name: [property names]}, "Qto": {name: [quantity names]}}, names sorted."""
+    return _cached(model, "catalogue", _build_catalogue)
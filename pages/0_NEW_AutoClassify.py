@@ -1,15 +1,17 @@
 # pages/0_🔍_AutoClassify.py
 from __future__ import annotations
 
-import re, unicodedata, tempfile
+import hashlib, re, unicodedata
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
-from rapidfuzz import process, fuzz
 import ifcopenshell, ifcopenshell.guid
 
-from helpers import load_model_from_bytes
+from helpers import session_model
+from model_index import ModelIndex, bump_revision, model_index, revision
+from ifc_export import ifc_download_button
+from keyword_index import KeywordIndex, best_matches
 
 # ───────── text helpers ─────────
 def normalize(txt: str) -> str:
@@ -27,29 +29,106 @@ def build_keyword_dict(df: pd.DataFrame):
     return out
 
 # ───────── IFC helper ─────────
-def element_has_scheme(el, scheme_name: str) -> bool:
-    """Return True if element already has an association under the given scheme."""
-    for assoc in el.HasAssociations or []:
-        if assoc.is_a("IfcRelAssociatesClassification"):
-            ref = assoc.RelatingClassification
-            rs = getattr(ref, "ReferencedSource", None)
-            if rs and getattr(rs, "Name", "") == scheme_name:
-                return True
-            # fallback – some models store scheme name directly on the reference
-            if getattr(ref, "Name", "") == scheme_name:
-                return True
-    return False
-
-def has_scheme_identification(el, scheme_root, ident: str) -> bool:
-    """Check if element already has this Identification under the scheme."""
-    for assoc in el.HasAssociations or []:
-        if assoc.is_a("IfcRelAssociatesClassification"):
-            ref = assoc.RelatingClassification
-            rs = getattr(ref, "ReferencedSource", None)
-            if (rs and getattr(rs, "Name", "") == scheme_root.Name) or getattr(ref, "Name", "") == scheme_root.Name:
-                if getattr(ref, "Identification", "") == ident:
-                    return True
-    return False
+def in_scheme(ref, scheme_name: str) -> bool:
+    """True if a classification (reference) belongs to the given scheme."""
+    rs = getattr(ref, "ReferencedSource", None)
+    if rs and getattr(rs, "Name", "") == scheme_name:
+        return True
+    # fallback – some models store scheme name directly on the reference
+    return getattr(ref, "Name", "") == scheme_name
+
+def scheme_identifications(index: ModelIndex, scheme_name: str) -> dict[str, set]:
+    """GUID → Identifications the element already has under the scheme (only classified elements)."""
+    out = {}
+    for guid, refs in index.classification_refs.items():
+        ids = {getattr(ref, "Identification", "") or "" for ref in refs if in_scheme(ref, scheme_name)}
+        if ids:
+            out[guid] = ids
+    return out
+
+def associate_classifications(model, scheme_root, targets: dict[str, tuple[str, list]]) -> None:
+    """Identification → (title, elements): one reference and one association per code.
+
+    Reuses an existing reference of the scheme with that Identification and
+    extends its association instead of creating new ones.
+    """
+    refs = {}
+    for ref in model.by_type("IfcClassificationReference"):
+        if ref.ReferencedSource == scheme_root:
+            refs.setdefault(ref.Identification, ref)
+    rels = {}
+    for rel in model.by_type("IfcRelAssociatesClassification"):
+        if rel.RelatingClassification is not None:
+            rels.setdefault(rel.RelatingClassification.id(), rel)
+
+    for num, (title, elements) in targets.items():
+        cls_ref = refs.get(num)
+        if cls_ref is None:
+            cls_ref = model.createIfcClassificationReference(
+                Identification=num, Name=title, ReferencedSource=scheme_root
+            )
+        rel = rels.get(cls_ref.id())
+        if rel is None:
+            model.createIfcRelAssociatesClassification(
+                GlobalId=ifcopenshell.guid.new(),
+                RelatedObjects=elements,
+                RelatingClassification=cls_ref,
+            )
+        else:
+            rel.RelatedObjects = list(rel.RelatedObjects) + elements
+
+# ───────── suggestions ─────────
+def match_elements(model, pset_name: str, scheme_name: str, kw_list: list[str],
+                   kw_index: KeywordIndex | None = None, exact: bool = False) -> tuple[pd.DataFrame, set]:
+    """Raw fuzzy match of every element not yet classified under the scheme.
+
+    Returns (guid, name, blob_text, matched_kw, raw_score) rows – threshold
+    independent – and the GUIDs of all products.
+    """
+    rows = []
+    guids = set()
+    index = model_index(model)
+    classified = scheme_identifications(index, scheme_name)
+
+    for el in model.by_type("IfcProduct"):
+        if not getattr(el, "GlobalId", None):
+            continue
+        guids.add(el.GlobalId)
+
+        if el.GlobalId in classified:
+            continue
+
+        texts = [str(getattr(el, "Name", ""))]
+        texts += [str(v) for v in index.pset(el.GlobalId, pset_name).values() if v is not None]
+        rows.append(
+            dict(
+                guid=el.GlobalId,
+                name=getattr(el, "Name", ""),
+                blob_text=" | ".join(texts)[:150],
+                blob=normalize(" ".join(texts)),
+            )
+        )
+
+    # fuzzy match: every distinct non-empty blob once, all blobs in one batch
+    blobs = list(dict.fromkeys(r["blob"] for r in rows if r["blob"]))
+    kw_idx, kw_score = best_matches(blobs, kw_list, kw_index, exact)
+    # no keyword scored (or none given) → ("", 0.0), kw_idx is only a placeholder then
+    matches = {blob: (kw_list[i], float(sc)) for blob, i, sc in zip(blobs, kw_idx, kw_score) if sc > 0}
+    for row in rows:
+        row["matched_kw"], row["raw_score"] = matches.get(row.pop("blob"), ("", 0.0))
+
+    cols = ["guid", "name", "blob_text", "matched_kw", "raw_score"]
+    return pd.DataFrame(rows, columns=cols), guids
+
+def apply_threshold(matches: pd.DataFrame, kw2num: dict, kw_dict: dict, threshold: float) -> pd.DataFrame:
+    """Suggestion + score columns for the given threshold (no re-matching)."""
+    df = matches.copy()
+    nums = df["matched_kw"].map(kw2num)
+    ok = nums.notna() & (df["raw_score"] >= threshold)
+    labels = {num: f"{num} - {v['title']}" for num, v in kw_dict.items()}
+    df["suggestion"] = nums.map(labels).where(ok, "")
+    df["score"] = df["raw_score"].astype(int).where(ok, 0)
+    return df
 
 # ───────── UI ─────────
 st.header("🔍 Auto-Classification (Keyword + Fuzzy, Mehrfachwahl pro Element)")
@@ -66,16 +145,22 @@ if up_map is None:
     st.info("Bitte Mapping-Datei hochladen.")
     st.stop()
 
-# Read mapping
-df_map = pd.read_excel(up_map, header=0) if up_map.name.lower().endswith(("xls", "xlsx")) else pd.read_csv(up_map)
-if len(df_map.columns) < 7:
-    df_map = df_map.reindex(columns=list(df_map.columns) + ["keywords"])
-df_map.columns = ["classification", "title", "_c", "_d", "_e", "_f", "keywords"][: len(df_map.columns)]
-
-kw_dict = build_keyword_dict(df_map)
-
-# Flat keyword → class map
-kw2num = {kw: num for num, data in kw_dict.items() for kw in data["keywords"]}
+# Read mapping (parsed once per file content)
+map_hash = hashlib.sha256(up_map.getvalue()).hexdigest()
+if st.session_state.get("autoclass_map", {}).get("hash") != map_hash:
+    df_map = pd.read_excel(up_map, header=0) if up_map.name.lower().endswith(("xls", "xlsx")) else pd.read_csv(up_map)
+    if len(df_map.columns) < 7:
+        df_map = df_map.reindex(columns=list(df_map.columns) + ["keywords"])
+    df_map.columns = ["classification", "title", "_c", "_d", "_e", "_f", "keywords"][: len(df_map.columns)]
+    kw_dict = build_keyword_dict(df_map)
+    # Flat keyword → class map + candidate index over its keywords
+    kw2num = {kw: num for num, data in kw_dict.items() for kw in data["keywords"]}
+    st.session_state.autoclass_map = dict(
+        hash=map_hash, kw_dict=kw_dict, kw2num=kw2num, kw_index=KeywordIndex(list(kw2num))
+    )
+kw_dict = st.session_state.autoclass_map["kw_dict"]
+kw2num = st.session_state.autoclass_map["kw2num"]
+kw_index = st.session_state.autoclass_map["kw_index"]
 kw_list = list(kw2num.keys())
 options_full = [f"{num} - {v['title']}" for num, v in kw_dict.items()]
 
@@ -83,57 +168,27 @@ options_full = [f"{num} - {v['title']}" for num, v in kw_dict.items()]
 pset_name  = st.text_input("Property-Set zum Durchsuchen", value="OEBBset_Semantik_Topologie")
 scheme_name = st.text_input("Name des Klassifikationsschemas", value="RC2")
 threshold  = st.slider("Fuzzy-Treffer-Schwelle (%)", 20, 100, 80, 5)
+exact      = st.checkbox(
+    "Vollständige Suche garantieren",
+    value=False,
+    help="Ohne Häkchen werden nur Katalogeinträge mit gemeinsamen Wörtern/Zeichenfolgen bewertet (schnell). "
+    "Mit Häkchen wird jedes Element gegen den ganzen Katalog geprüft.",
+)
+zip_out    = st.checkbox("IFC-Download als .ifcZIP komprimieren", value=False)
 
 # Load IFC
-if "model" not in st.session_state:
-    model, _ = load_model_from_bytes(st.session_state.ifc_bytes)
-    st.session_state.model = model
-else:
-    model = st.session_state.model
-
-# Build suggestions + keep a GUID -> element map for later write
-rows = []
-guid_to_element = {}
-
-for el in model.by_type("IfcProduct"):
-    if not getattr(el, "GlobalId", None):
-        continue
-    guid_to_element[el.GlobalId] = el
-
-    if element_has_scheme(el, scheme_name):
-        continue
-
-    texts = [str(getattr(el, "Name", ""))]
-    for rel in el.IsDefinedBy or []:
-        if rel.is_a("IfcRelDefinesByProperties"):
-            pset = rel.RelatingPropertyDefinition
-            if pset.is_a("IfcPropertySet") and pset.Name == pset_name:
-                for p in pset.HasProperties:
-                    if p.is_a("IfcPropertySingleValue") and p.NominalValue:
-                        texts.append(str(p.NominalValue.wrappedValue))
-    blob = normalize(" ".join(texts))
-
-    best_kw, best_score = "", 0
-    if blob:
-        m = process.extractOne(blob, kw_list, scorer=fuzz.token_set_ratio)
-        if m:
-            best_kw, best_score = m[0], m[1]
-
-    best_num = kw2num.get(best_kw, "")
-    suggested = f"{best_num} - {kw_dict[best_num]['title']}" if best_num and best_score >= threshold else ""
-
-    rows.append(
-        dict(
-            guid=el.GlobalId,
-            name=getattr(el, "Name", ""),
-            blob_text=" | ".join(texts)[:150],
-            matched_kw=best_kw,
-            score=int(best_score if suggested else 0),
-            suggestion=suggested,
-        )
-    )
-
-df = pd.DataFrame(rows)
+model = session_model(st.session_state)
+
+# Raw matches are cached per (model + revision, mapping, pset, scheme): the
+# threshold slider and the multiselects below only filter / re-render
+match_key = (revision(model), map_hash, pset_name, scheme_name, exact)
+cached = st.session_state.get("autoclass_matches")
+if cached is None or cached["model"] is not model or cached["key"] != match_key:
+    with st.spinner("Suche Klassifikationsvorschläge …"):
+        matches, guids = match_elements(model, pset_name, scheme_name, kw_list, kw_index, exact)
+    cached = st.session_state.autoclass_matches = dict(model=model, key=match_key, matches=matches, guids=guids)
+
+df = apply_threshold(cached["matches"], kw2num, kw_dict, threshold)
 if df.empty:
     st.info("Keine klassifizierbaren Elemente gefunden.")
     st.stop()
@@ -159,48 +214,44 @@ for i, row in df.iterrows():
 
 # Write classifications
 if st.button("✍️ Klassifikationen schreiben"):
+    model = session_model(st.session_state, writable=True)  # private copy before the first write
     scheme_root = next((c for c in model.by_type("IfcClassification") if c.Name == scheme_name), None)
     if scheme_root is None:
         scheme_root = model.createIfcClassification(Name=scheme_name, Source="AutoClass")
 
-    written = 0
+    existing = scheme_identifications(model_index(model), scheme_name)
+    targets: dict[str, tuple[str, list]] = {}
     for guid, choices in selections.items():
         if not choices:
             continue
-        el = guid_to_element.get(guid)
-        if el is None:
+        if guid not in cached["guids"]:
             continue
+        el = model.by_guid(guid)
+        have = existing.setdefault(guid, set())
 
         for choice in choices:
             try:
                 num, title = choice.split(" - ", 1)
             except ValueError:
                 num, title = choice, ""  # tolerate raw code
-            if has_scheme_identification(el, scheme_root, num):
+            if num in have:
                 continue
-            cls_ref = model.createIfcClassificationReference(
-                Identification=num, Name=title, ReferencedSource=scheme_root
-            )
-            model.createIfcRelAssociatesClassification(
-                GlobalId=ifcopenshell.guid.new(),
-                RelatedObjects=[el],
-                RelatingClassification=cls_ref,
-            )
-            written += 1
+            have.add(num)
+            targets.setdefault(num, (title, []))[1].append(el)
 
+    written = sum(len(elements) for _, elements in targets.values())
     if not written:
         st.warning("Keine neuen Klassifikationen geschrieben.")
         st.stop()
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ifc")
-    model.write(tmp.name)
-    with open(tmp.name, "rb") as f:
-        st.download_button(
-            "💾 IFC herunterladen",
-            f.read(),
-            file_name=Path(st.session_state.ifc_name).stem + f"_{scheme_name}.ifc",
-            mime="application/octet-stream",
-        )
+    associate_classifications(model, scheme_root, targets)
+    bump_revision(model)
+
+    ifc_download_button(
+        "💾 IFC herunterladen",
+        model,
+        Path(st.session_state.ifc_name).stem + f"_{scheme_name}.ifc",
+        zipped=zip_out,
+    )
     st.success(f"{written} Klassifikationen geschrieben.")
 
 
@@ -1,51 +1,26 @@
 # pages/3_🧮_Autofill_Qto.py
 from __future__ import annotations
 
-import tempfile
+import time
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Iterator, Optional
 
-import numpy as np
+import pandas as pd
 import streamlit as st
 import ifcopenshell
 import ifcopenshell.guid
-import ifcopenshell.geom
-from helpers import load_model_from_bytes
-
-
-# ────────────────────────── Mesh mass-properties (no extra deps) ─────────────
-def tri_area(v0: np.ndarray, v1: np.ndarray, v2: np.ndarray) -> float:
-    return 0.5 * np.linalg.norm(np.cross(v1 - v0, v2 - v0))
-
-
-def mesh_area_and_volume(verts: np.ndarray, faces: np.ndarray) -> Tuple[float, float]:
-    """Return (surface_area, volume) from a triangle mesh.
-    Volume via signed tetrahedra wrt origin (abs at end).
-    """
-    area = 0.0
-    vol = 0.0
-    for a, b, c in faces:
-        v0, v1, v2 = verts[a], verts[b], verts[c]
-        area += tri_area(v0, v1, v2)
-        vol += np.dot(v0, np.cross(v1, v2)) / 6.0
-    return float(area), abs(float(vol))
-
-
-def bbox_longest_edge(verts: np.ndarray) -> float:
-    mins = verts.min(axis=0)
-    maxs = verts.max(axis=0)
-    return float((maxs - mins).max())
+from helpers import content_hash, ifc_path_for, session_model
+from ifc_export import download_name, ifc_download_button
+from analytic import ANALYTIC, INSTANCED, MESH
+from mesh_cache import MeshCache
+from model_index import bump_revision
+from prescan import suggested_geometry_settings, suggested_workers
+from qto_pipeline import Result, failures_frame, iter_element_metrics
+from tessellation import DEFAULT_THREADS, DEFAULT_TIMEOUT_S, MAX_THREADS, geom_settings
+from worklist import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, build_worklist, parse_classes
 
 
 # ───────────────────────────── Helpers for IFC Qto ───────────────────────────
-def element_has_qto(element) -> bool:
-    for rel in element.IsDefinedBy or []:
-        if rel.is_a("IfcRelDefinesByProperties"):
-            if rel.RelatingPropertyDefinition.is_a("IfcElementQuantity"):
-                return True
-    return False
-
-
 QTO_MAP: Dict[str, str] = {
     "IfcWall": "Qto_WallBaseQuantities",
     "IfcWallStandardCase": "Qto_WallBaseQuantities",
@@ -74,37 +49,31 @@ def make_quantity(model: ifcopenshell.file, qtype: str, name: str, value: float)
     )
 
 
-def generate_qto(model: ifcopenshell.file) -> int:
-    """Create missing Qto sets & quantities using tessellated geometry."""
-    settings = ifcopenshell.geom.settings()
-    settings.set(settings.USE_WORLD_COORDS, True)
-    # NOTE: By default the tessellated geometry often has openings subtracted.
-    # If you want "gross" values (incl. openings), configure settings accordingly
-    # for your IfcOpenShell build, or post-process as needed.
-
-    new_count = 0
+# metric kinds (see geometry.MeshMetrics) behind the written quantities
+QTO_KINDS = {"VOLUME_GROSS", "AREA_SURF_TOTAL", "LENGTH_LONGEST"}
 
-    for el in model.by_type("IfcProduct"):
-        if not getattr(el, "GlobalId", None):
-            continue
 
-        if element_has_qto(el):
-            continue  # keep author-supplied quantities
+def generate_qto(model: ifcopenshell.file, work: Dict[str, tuple], **pipeline_kw) -> Iterator[Result]:
+    """Stream (guid, method, values) for the pre-scanned worklist.
 
-        try:
-            shape = ifcopenshell.geom.create_shape(settings, el)
-        except Exception:
-            continue  # no geometry or failed BREP -> skip
+    Simple extrusions are measured analytically, mapped items from one mesh
+    per representation map, everything else from the tessellated geometry
+    (see qto_pipeline.iter_element_metrics for `pipeline_kw`).
+    Nothing is written to the model here – see write_qto.
+    """
+    todo = {guid: el for guid, (el, _) in work.items()}
+    return iter_element_metrics(model, todo, lambda guid: QTO_KINDS, **pipeline_kw)
 
-        # verts: flat array [x0,y0,z0, x1,y1,z1, ...]
-        verts = np.asarray(shape.geometry.verts, dtype=float).reshape(-1, 3)
-        faces = np.asarray(shape.geometry.faces, dtype=int).reshape(-1, 3)
 
-        if len(verts) == 0 or len(faces) == 0:
-            continue
+def write_qto(model: ifcopenshell.file, results: Dict[str, tuple]) -> int:
+    """Create one Qto set per computed element; returns the number of sets."""
+    new_count = 0
 
-        area, volume = mesh_area_and_volume(verts, faces)
-        length = bbox_longest_edge(verts)
+    for guid, (_method, values) in results.items():
+        el = model.by_guid(guid)
+        volume = values["VOLUME_GROSS"]
+        area = values["AREA_SURF_TOTAL"]
+        length = values["LENGTH_LONGEST"]
 
         # Choose Qto set name by class, else generic
         cls = el.is_a()
@@ -143,42 +112,131 @@ def generate_qto(model: ifcopenshell.file) -> int:
 
         new_count += 1
 
+    bump_revision(model)
     return new_count
 
 
+RESULT_COLUMNS = ["guid", "class", "method", "GrossVolume", "GrossArea", "Length"]
+TAIL_ROWS = 100  # rows shown while a run is going
+
+
+def result_row(element, method: str, values: Dict[str, float]) -> tuple:
+    """Table row of one result, built once when it arrives."""
+    return (element.GlobalId, element.is_a(), method,
+            values["VOLUME_GROSS"], values["AREA_SURF_TOTAL"], values["LENGTH_LONGEST"])
+
+
+def results_frame(rows: list, tail: Optional[int] = None) -> pd.DataFrame:
+    """All result rows, or only the last `tail` ones (live view)."""
+    return pd.DataFrame(rows[-tail:] if tail else rows, columns=RESULT_COLUMNS)
+
+
+def write_and_offer_download(run: dict) -> None:
+    model = session_model(st.session_state, writable=True)
+    added = write_qto(model, run["results"])
+    run["written"] = True
+
+    paths = [method for method, _ in run["results"].values()]
+    st.success(
+        f"Fertig – {added} ElementQuantity-Sets neu erstellt "
+        f"({paths.count(ANALYTIC)} analytisch, {paths.count(INSTANCED)} über gemeinsame Geometrie, "
+        f"{paths.count(MESH)} über Tessellierung)."
+    )
+
+    # serialized in memory when the button is clicked
+    ifc_download_button(
+        f"💾 Geänderte IFC herunterladen ({download_name(default_name, zip_out)})",
+        model,
+        default_name,
+        zipped=zip_out,
+    )
+
+
 # ─────────────────────────────── Streamlit UI ────────────────────────────────
 st.header("🧮 Autofill Qto (Quantity Take-Off)")
 
 if "ifc_bytes" not in st.session_state:
     st.error("Bitte zuerst eine IFC-Datei auf der Startseite hochladen.")
     st.stop()
-if "model" not in st.session_state:
-    # first time we enter this page → load IFC bytes now
-    model, tmp_path = load_model_from_bytes(st.session_state.ifc_bytes)
-    st.session_state.model = model
-    st.session_state.ifc_path = tmp_path
-
-model: ifcopenshell.file = st.session_state.model
+# geometry runs on the (possibly shared) model; writing switches to a private copy
+model: ifcopenshell.file = session_model(st.session_state)
 default_name = Path(st.session_state.ifc_name).stem + "_with_qto.ifc"
 
+# defaults follow the upload pre-scan (element count, BREP share)
+default_threads, default_isolate = suggested_geometry_settings(st.session_state.get("prescan"), DEFAULT_THREADS)
+threads = st.number_input(
+    "Threads für die Tessellierung", min_value=1, max_value=MAX_THREADS, value=default_threads, step=1
+)
+isolate = st.checkbox(
+    "Geometrie in isolierten Prozessen berechnen (Timeout je Element)",
+    value=default_isolate,
+    help="Schützt die Sitzung vor hängenden oder abstürzenden BREPs; etwas langsamer.",
+)
+timeout_s = st.number_input("Timeout je Element (s)", min_value=1.0, value=DEFAULT_TIMEOUT_S, disabled=not isolate)
+workers = st.number_input(
+    "Isolierte Prozesse",
+    min_value=1,
+    max_value=MAX_THREADS,
+    value=suggested_workers(st.session_state.get("prescan")),
+    step=1,
+    disabled=not isolate,
+    help="Jeder Prozess liest das ganze Modell ein – die Vorgabe richtet sich nach dem freien Arbeitsspeicher.",
+)
+col_in, col_ex = st.columns(2)
+include_txt = col_in.text_input("IFC-Klassen einschließen", value=", ".join(DEFAULT_INCLUDE))
+exclude_txt = col_ex.text_input("IFC-Klassen ausschließen", value=", ".join(DEFAULT_EXCLUDE))
+zip_out = st.checkbox("IFC-Download als .ifcZIP komprimieren", value=False)
+
+# a run lives in session state so that a cancel (= rerun) keeps finished elements
+run = st.session_state.get("qto_run")
+
 if st.button("⚙️  Fehlende Qto automatisch erzeugen"):
-    with st.spinner("Berechne Geometrie & erstelle Quantity-Sets …"):
-        added = generate_qto(model)
-
-    st.success(f"Fertig – {added} ElementQuantity-Sets neu erstellt.")
-
-    # Write to a temp file and offer download
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ifc")
-    tmp_path = tmp.name
-    tmp.close()
-    model.write(tmp_path)
-
-    with open(tmp_path, "rb") as f:
-        st.download_button(
-            label=f"💾 Geänderte IFC herunterladen ({default_name})",
-            data=f,
-            file_name=default_name,
-            mime="application/octet-stream",
-        )
+    work, counts = build_worklist(
+        model,
+        include=parse_classes(include_txt),
+        exclude=parse_classes(exclude_txt),
+        skip_with_qto=True,
+    )
+    st.info(" • ".join(f"{k}: {v}" for k, v in counts.items()))
+
+    run = st.session_state.qto_run = dict(results={}, rows=[], failures={}, total=len(work), done=False, written=False)
+    st.button("⏹ Abbrechen", help="Bereits berechnete Elemente bleiben erhalten.")
+    bar = st.progress(0.0, text="Berechne Geometrie …")
+    table = st.empty()
+
+    ifc_hash = st.session_state.get("ifc_sha256") or content_hash(st.session_state.ifc_bytes)
+    stream = generate_qto(
+        model,
+        work,
+        threads=int(threads),
+        cache=MeshCache(ifc_hash, geom_settings()),
+        isolate_path=ifc_path_for(st.session_state) if isolate else None,
+        timeout=float(timeout_s),
+        failures=run["failures"],
+        workers=int(workers),
+    )
+    last_draw = 0.0
+    for i, (guid, method, values) in enumerate(stream, 1):
+        run["results"][guid] = (method, values)
+        run["rows"].append(result_row(work[guid][0], method, values))
+        bar.progress(min(i / max(run["total"], 1), 1.0), text=f"{i} / {run['total']} Elemente berechnet")
+        if time.monotonic() - last_draw > 0.5:  # redraw at most twice per second, newest rows only
+            table.dataframe(results_frame(run["rows"], TAIL_ROWS), use_container_width=True, height=300)
+            last_draw = time.monotonic()
+    run["done"] = True
+    bar.progress(1.0, text=f"{len(run['results'])} / {run['total']} Elemente berechnet")
+    table.dataframe(results_frame(run["rows"]), use_container_width=True, height=300)
+
+    if run["failures"]:
+        st.warning(f"{len(run['failures'])} Elemente übersprungen (Timeout/Absturz der Geometrie).")
+        st.dataframe(failures_frame(model, run["failures"]), use_container_width=True)
+    write_and_offer_download(run)
+
+elif run and not run["done"] and not run["written"]:
+    # the previous run was interrupted by "Abbrechen" (or any other widget)
+    st.warning(f"Abgebrochen – {len(run['results'])} von {run['total']} Elementen berechnet.")
+    st.dataframe(results_frame(run["rows"]), use_container_width=True, height=300)
+    if run["results"] and st.button("💾 Teilergebnisse in IFC schreiben"):
+        write_and_offer_download(run)
 else:
     st.info("Drücken Sie **Fehlende Qto automatisch erzeugen**, um Mengen zu berechnen.")
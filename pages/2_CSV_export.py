@@ -3,7 +3,7 @@ import io
 from pathlib import Path
 import streamlit as st
 
-from helpers import load_model_from_bytes, extract_ifc_to_dataframe
+from helpers import extract_ifc_to_dataframe, session_model
 
 st.header("📥 Lesen & Schreiben CSV")
 
@@ -22,14 +22,9 @@ if read_btn:
 #        model, tmp_path = load_model_from_bytes(st.session_state.ifc_bytes)
 #        st.session_state.model = model   # store for Page 2
 #        st.session_state.ifc_path = tmp_path
-    if "model" not in st.session_state:
-        # no model yet (user skipped Qto page) → load original IFC
-        with st.spinner("Lade IFC …"):
-            model, tmp_path = load_model_from_bytes(st.session_state.ifc_bytes)
-            st.session_state.model = model
-            st.session_state.ifc_path = tmp_path
-    else:
-        model = st.session_state.model    # Qto page already created / modified it
+    # original IFC (shared, cached) or the copy a writer page already modified
+    with st.spinner("Lade IFC …"):
+        model = session_model(st.session_state)
     with st.spinner("Extrahiere…"):
         df = extract_ifc_to_dataframe(model, pset_name, split_classifications=split_cls)
         st.session_state.df = df
@@ -4,28 +4,42 @@
   - guid  | Position_1 | Menge_1 | Position_2 | Menge_2 | …  
   - pre-filled from the IFC model (classifications + GrossVolume)  
   - user can overwrite any cell
+  - the sheet stays on the server: filter (class, classification, name),
+    sort and page through it; only the visible page goes to the browser,
+    edits are collected in a change buffer in the session
 
 • Button 2 → writes the edited table back into the IFC
   - every row updates / creates PropertySet `OEBBset_RC2`
+  - optionally rows with identical values share one PropertySet
   - Pruefung column optional (default TRUE)
+  - after the first save only cells changed since the last save are written
   - re-uses helper functions from helpers.py
 """
 from __future__ import annotations
 
 import re
-import tempfile
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
 import pandas as pd
 import streamlit as st
 import ifcopenshell
-import ifcopenshell.guid
 
 from helpers import (
     get_classification_strings,
     _get_gross_volume,            # <- already in helpers.py
+    own_pset,
+    session_model,
+    write_shared_psets,
 )
+from model_index import bump_revision, model_index, revision
+from ifc_export import download_name, ifc_download_button
+from property_writer import PropertyWriter
+
+PSET_NAME = "OEBBset_RC2"
+# regex to capture Position_n / Menge_n
+POS_PAT = re.compile(r"Position_(\d+)")
+MEN_PAT = re.compile(r"Menge_(\d+)")
 
 ###############################################################################
 # ------------------------- util: build initial DF ---------------------------
@@ -36,15 +50,16 @@ def build_rc2_dataframe(model: ifcopenshell.file) -> pd.DataFrame:
     """Return a DataFrame with guid + dynamic Position_n / Menge_n columns."""
     records: List[Dict] = []
     max_n = 0
+    index = model_index(model)
 
     for el in model.by_type("IfcProduct"):
         if not getattr(el, "GlobalId", None):
             continue
 
-        cls_list = get_classification_strings(el)
-        gross_vol = _get_gross_volume(el)
+        cls_list = get_classification_strings(el, index)
+        gross_vol = _get_gross_volume(el, index)
         elem_name  = getattr(el, "Name", "") or ""
-        row: Dict = {"guid": el.GlobalId, "Name": elem_name, "Pruefung": False}
+        row: Dict = {"guid": el.GlobalId, "Name": elem_name, "class": el.is_a(), "Pruefung": False}
 
         for idx, cls in enumerate(cls_list, start=1):
             row[f"Position_{idx}"] = cls
@@ -53,7 +68,7 @@ def build_rc2_dataframe(model: ifcopenshell.file) -> pd.DataFrame:
         records.append(row)
 
     # make sure every Position_n/Menge_n column exists even if NaN
-    cols = ["guid", "Name", "Pruefung"]
+    cols = ["guid", "Name", "class", "Pruefung"]
     for i in range(1, max_n + 1):
         cols += [f"Position_{i}", f"Menge_{i}"]
 
@@ -61,92 +76,154 @@ def build_rc2_dataframe(model: ifcopenshell.file) -> pd.DataFrame:
     return df
 
 
+###############################################################################
+# ------------- util: paged view + change buffer -----------------------------
+###############################################################################
+READ_ONLY_COLS = ["guid", "Name", "class"]
+PAGE_SIZES = (50, 100, 250, 500)
+
+
+def apply_changes(df: pd.DataFrame, changes: Dict[str, Dict[str, object]]) -> pd.DataFrame:
+    """Sheet with the buffered edits (GUID → {column: value}) applied."""
+    if not changes:
+        return df
+    out = df.copy()
+    rows = pd.Index(out["guid"]).get_indexer(list(changes))
+    for row, cells in zip(rows, changes.values()):
+        if row < 0:
+            continue
+        for col, value in cells.items():
+            out.iat[row, out.columns.get_loc(col)] = value
+    return out
+
+
+def filter_sheet(df: pd.DataFrame, classes: List[str], cls_text: str, name_text: str) -> pd.DataFrame:
+    """Rows of the given IFC classes whose Position_n / Name contain the texts."""
+    mask = pd.Series(True, index=df.index)
+    if classes:
+        mask &= df["class"].isin(classes)
+    if cls_text:
+        pos_cols = [c for c in df.columns if POS_PAT.fullmatch(c)]
+        hit = pd.Series(False, index=df.index)
+        for col in pos_cols:
+            hit |= df[col].fillna("").astype(str).str.contains(cls_text, case=False, regex=False)
+        mask &= hit
+    if name_text:
+        mask &= df["Name"].fillna("").astype(str).str.contains(name_text, case=False, regex=False)
+    return df[mask]
+
+
+def record_edits(base: pd.DataFrame, edited: pd.DataFrame, changes: Dict[str, Dict[str, object]]) -> None:
+    """Store the cells of the `edited` page that differ from the built sheet in `changes`."""
+    cols = [c for c in edited.columns if c not in READ_ONLY_COLS]
+    orig = base.set_index("guid").loc[edited["guid"], cols]
+    cur = edited.set_index("guid")[cols]
+    diff = ~((cur == orig) | (cur.isna() & orig.isna()))
+    for guid, row in diff.iterrows():  # one page at most
+        cells = {col: cur.at[guid, col] for col in cols if row[col]}
+        if cells:
+            changes[guid] = cells
+        else:
+            changes.pop(guid, None)
+
+
 ###############################################################################
 # ------------- util: write DF values back to the IFC model ------------------
 ###############################################################################
 
 
-def upsert_single_value(
-    model: ifcopenshell.file,
-    pset,
-    name: str,
-    value,
-    ifc_type: str,
-):
-    """Add or update a property named `name` in `pset`."""
-    existing = next((p for p in pset.HasProperties if p.Name == name), None)
-    if existing:
-        existing.NominalValue.wrappedValue = value
-    else:
-        prop = model.createIfcPropertySingleValue(
-            Name=name,
-            Description=None,
-            NominalValue=model.create_entity(ifc_type, value),
-            Unit=None,
-        )
-        pset.HasProperties = pset.HasProperties + (prop,)
-
-
-def sync_rc2_to_ifc(model: ifcopenshell.file, df: pd.DataFrame):
-    """Iterate DataFrame rows and push values into Pset OEBBset_RC2."""
+def column_plan(columns) -> List[Tuple[str, str]]:
+    """(column, IFC type) of every sheet column that is written – compiled once per sheet."""
+    plan = [("Pruefung", "IfcBoolean")]
+    for col in columns:
+        if POS_PAT.fullmatch(col):
+            plan.append((col, "IfcLabel"))
+        elif MEN_PAT.fullmatch(col):
+            plan.append((col, "IfcVolumeMeasure"))
+    return plan
+
+
+def cell_value(ifc_type: str, val):
+    """Sheet cell → property value; None means 'leave the property alone'."""
+    if ifc_type == "IfcBoolean":
+        return bool(val)
+    if pd.isna(val) or val == "":
+        return None
+    return str(val) if ifc_type == "IfcLabel" else float(val)
+
+
+def changed_cells(base: pd.DataFrame, df: pd.DataFrame, plan) -> Dict[str, Set[str]]:
+    """GUID → plan columns whose value differs from `base` (new GUIDs: all columns)."""
+    cols = [col for col, _ in plan]
+    cur = df.drop_duplicates("guid", keep="last").set_index("guid").reindex(columns=cols)
+    old = base.drop_duplicates("guid", keep="last").set_index("guid").reindex(columns=cols)
+    cur.loc[:, "Pruefung"] = cur["Pruefung"].fillna(True)  # missing Pruefung counts as TRUE
+    old.loc[:, "Pruefung"] = old["Pruefung"].fillna(True)
+
+    common = cur.index.intersection(old.index)
+    a, b = cur.loc[common].astype(object), old.loc[common].astype(object)
+    diff = ~((a == b) | (a.isna() & b.isna()))
+    hits = diff.stack()
+    out: Dict[str, Set[str]] = {}
+    for guid, col in hits[hits].index:
+        out.setdefault(guid, set()).add(col)
+    for guid in cur.index.difference(old.index):
+        out[guid] = set(cols)
+    return out
+
+
+def sheet_updates(df: pd.DataFrame, plan, cells: Optional[Dict[str, Set[str]]] = None) -> Dict[str, Dict[str, tuple]]:
+    """GUID → {property name: (IFC type, value)}; restricted to `cells` if given."""
+    frame = df if "Pruefung" in df.columns else df.assign(Pruefung=True)
+    if cells is not None:
+        frame = frame[frame["guid"].isin(cells.keys())]
+    updates: Dict[str, Dict[str, tuple]] = {}
+    cols = [col for col, _ in plan]
+    for guid, *vals in zip(frame["guid"], *(frame[c] for c in cols)):  # later rows win
+        wanted = cells[guid] if cells is not None else None
+        values = {}
+        for (col, ifc_type), val in zip(plan, vals):
+            if wanted is not None and col not in wanted:
+                continue
+            value = cell_value(ifc_type, val)
+            if value is not None:
+                values[col] = (ifc_type, value)
+        updates[guid] = values
+    return updates
+
+
+def sync_rc2_to_ifc(model: ifcopenshell.file, df: pd.DataFrame, shared: bool = False,
+                    base: Optional[pd.DataFrame] = None) -> int:
+    """Push sheet values into Pset OEBBset_RC2; returns the number of elements written.
+
+    base → the sheet as last written into `model`: only changed cells are written.
+    shared=True → rows with identical values share one P-set / relation.
+    """
+    plan = column_plan(df.columns)
+    cells = changed_cells(base, df, plan) if base is not None else None
     guid_index = {el.GlobalId: el for el in model.by_type("IfcProduct")}
+    updates = {}
+    for guid, values in sheet_updates(df, plan, cells).items():
+        el = guid_index.get(guid)
+        if el and values:  # else: GUID disappeared / nothing to write
+            updates[el] = values
+    if not updates:
+        return 0
 
-    # regex to capture Position_n / Menge_n
-    pos_pat = re.compile(r"Position_(\d+)")
-    men_pat = re.compile(r"Menge_(\d+)")
+    if shared:
+        write_shared_psets(model, PSET_NAME, updates)
+        bump_revision(model)
+        return len(updates)
 
-    for _, row in df.iterrows():
-        guid = row["guid"]
-        el = guid_index.get(guid)
-        if not el:
-            continue  # GUID disappeared
-
-        # find or create P-set
-        pset = None
-        for rel in el.IsDefinedBy or []:
-            if rel.is_a("IfcRelDefinesByProperties"):
-                obj = rel.RelatingPropertyDefinition
-                if obj.is_a("IfcPropertySet") and obj.Name == "OEBBset_RC2":
-                    pset = obj
-                    break
-
-        if pset is None:
-            pset = model.createIfcPropertySet(
-                GlobalId=ifcopenshell.guid.new(),
-                OwnerHistory=None,
-                Name="OEBBset_RC2",
-                Description=None,
-                HasProperties=(),
-            )
-            model.createIfcRelDefinesByProperties(
-                GlobalId=ifcopenshell.guid.new(),
-                OwnerHistory=None,
-                Name=None,
-                Description=None,
-                RelatedObjects=[el],
-                RelatingPropertyDefinition=pset,
-            )
-
-        # --- Pruefung -------------------------------------------------------
-        pruefung_value = bool(row.get("Pruefung", True))
-        upsert_single_value(model, pset, "Pruefung", pruefung_value, "IfcBoolean")
-
-        # --- dynamic Position_n / Menge_n ----------------------------------
-        for col in df.columns:
-            if m := pos_pat.fullmatch(col):
-                idx = m.group(1)
-                val = row[col]
-                if pd.notna(val) and val != "":
-                    upsert_single_value(
-                        model, pset, f"Position_{idx}", str(val), "IfcLabel"
-                    )
-            elif m := men_pat.fullmatch(col):
-                idx = m.group(1)
-                val = row[col]
-                if pd.notna(val):
-                    upsert_single_value(
-                        model, pset, f"Menge_{idx}", float(val), "IfcVolumeMeasure"
-                    )
+    for el, values in updates.items():
+        pset = own_pset(model, el, PSET_NAME)  # split off first if shared
+
+        with PropertyWriter(model, pset) as props:
+            for name, (ifc_type, value) in values.items():
+                props.single_value(name, value, ifc_type)
+
+    bump_revision(model)
+    return len(updates)
 
 
 ###############################################################################
@@ -158,42 +235,82 @@ if "model" not in st.session_state:
     st.error("Bitte laden und extrahieren Sie zuerst eine IFC unter **📥 Lesen & Schreiben CSV**.")
     st.stop()
 
-model: ifcopenshell.file = st.session_state.model
+model: ifcopenshell.file = session_model(st.session_state)
 default_name = Path(st.session_state.ifc_name).stem + "_RC2.ifc"
+zip_out = st.checkbox("IFC-Download als .ifcZIP komprimieren", value=False)
+share_psets = st.checkbox(
+    "Gleiche Werte in gemeinsamen PropertySets speichern",
+    value=True,
+    help="Bauteile mit identischen Werten teilen sich ein PropertySet – deutlich kleinere IFC.",
+)
 
 # 1) Build / show editable sheet ------------------------------------------------
 if st.button("🔄 Bearbeitbare Tabelle erzeugen"):
     st.session_state.rc2_df = build_rc2_dataframe(model)
+    st.session_state.rc2_changes = {}
 
 if "rc2_df" in st.session_state:
-    edited_df = st.data_editor(
-        st.session_state.rc2_df,
-        num_rows="dynamic",
+    base_df: pd.DataFrame = st.session_state.rc2_df
+    changes = st.session_state.setdefault("rc2_changes", {})
+    sheet = apply_changes(base_df, changes)
+
+    f1, f2, f3 = st.columns(3)
+    classes = f1.multiselect("IFC-Klasse", sorted(sheet["class"].dropna().unique()))
+    cls_text = f2.text_input("Klassifikation enthält")
+    name_text = f3.text_input("Name enthält")
+    s1, s2, s3 = st.columns([2, 1, 1])
+    sort_col = s1.selectbox("Sortieren nach", ["—"] + list(sheet.columns))
+    descending = s2.checkbox("absteigend", value=False)
+    page_size = s3.selectbox("Zeilen pro Seite", PAGE_SIZES, index=1)
+
+    view = filter_sheet(sheet, classes, cls_text, name_text)
+    if sort_col != "—":
+        view = view.sort_values(sort_col, ascending=not descending, kind="stable", na_position="last")
+    n_pages = max(1, -(-len(view) // page_size))
+    # new filter / sort → back to page 1
+    view_sig = hash((tuple(classes), cls_text, name_text, sort_col, descending, page_size))
+    page = st.number_input("Seite", min_value=1, max_value=n_pages, value=1, key=f"rc2_page_{view_sig}_{n_pages}")
+    page_df = view.iloc[(page - 1) * page_size: page * page_size]
+
+    status = st.empty()  # filled at the end – a save below clears the buffer
+    edited_page = st.data_editor(
+        page_df,
         use_container_width=True,
-        height=600,
-        key="rc2_editor",
+        hide_index=True,
+        disabled=READ_ONLY_COLS,
+        # rows may move after an edit (sorting) → fresh editor state per row order
+        key=f"rc2_editor_{hash(tuple(page_df['guid']))}",
     )
-    # keep latest edits in session
-    st.session_state.rc2_df = edited_df
+    record_edits(base_df, edited_page, changes)
 else:
     st.info("Klicken Sie auf **Bearbeitbare Tabelle erzeugen** um zu starten.")
 
 # 2) Write back & offer download ------------------------------------------------
 if "rc2_df" in st.session_state and st.button("💾 In IFC speichern & herunterladen"):
     with st.spinner("Schreiben IFC …"):
-        sync_rc2_to_ifc(model, st.session_state.rc2_df)
-
-        # temp-file path for this session
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ifc")
-        tmp_path = tmp.name
-        tmp.close()
-        model.write(tmp_path)
-
-    with open(tmp_path, "rb") as f:
-        st.download_button(
-            label=f"⬇️ Modifizierte IFC herunterladen ({default_name})",
-            data=f,
-            file_name=default_name,
-            mime="application/octet-stream",
-        )
-    st.success("Fertig! Laden Sie Ihre IFC oben herunter.")
+        model = session_model(st.session_state, writable=True)
+        # delta against the last save into this very model (else: full write)
+        synced = st.session_state.get("rc2_synced")
+        base = None
+        if synced and synced["model"] is model and synced["revision"] == revision(model):
+            base = synced["frame"]
+        sheet = apply_changes(st.session_state.rc2_df, st.session_state.get("rc2_changes", {}))
+        written = sync_rc2_to_ifc(model, sheet, shared=share_psets, base=base)
+        st.session_state.rc2_df = sheet
+        st.session_state.rc2_changes = {}
+        st.session_state.rc2_synced = dict(model=model, revision=revision(model), frame=sheet)
+
+    # serialized in memory when the button is clicked
+    ifc_download_button(
+        f"⬇️ Modifizierte IFC herunterladen ({download_name(default_name, zip_out)})",
+        model,
+        default_name,
+        zipped=zip_out,
+    )
+    st.success(f"Fertig! {written} Bauteile geschrieben – laden Sie Ihre IFC oben herunter.")
+
+if "rc2_df" in st.session_state:
+    status.caption(
+        f"{len(view)} von {len(sheet)} Zeilen · Seite {page}/{n_pages} · "
+        f"{len(st.session_state.rc2_changes)} Bauteile mit ungespeicherten Änderungen"
+    )
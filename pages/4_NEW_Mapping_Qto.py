@@ -19,61 +19,23 @@ Mapping-driven quantity take-off + OEBBset_RC2_KE writer
 from __future__ import annotations
 
 import io
-import tempfile
+import time
 from pathlib import Path
-from typing import Tuple
 
-import numpy as np
 import pandas as pd
 import streamlit as st
 import ifcopenshell
-import ifcopenshell.geom
 import ifcopenshell.guid
 
-from helpers import load_model_from_bytes, get_classification_strings
-
-# ───────────────────────── geometry helpers ─────────────────────────
-def tri_area(v0, v1, v2):
-    return 0.5 * np.linalg.norm(np.cross(v1 - v0, v2 - v0))
-
-def mesh_area_and_volume(verts, faces) -> Tuple[float, float]:
-    area = vol = 0.0
-    for a, b, c in faces:
-        v0, v1, v2 = verts[a], verts[b], verts[c]
-        area += tri_area(v0, v1, v2)
-        vol += np.dot(v0, np.cross(v1, v2)) / 6.0
-    return area, abs(vol)
-
-def bbox_longest_edge(v):  return float((v.max(0) - v.min(0)).max())
-def bbox_height(v):        return float(v[:, 2].ptp())
-def bbox_diag_xy(v):       return float(np.linalg.norm(v[:, :2].ptp(0)))
-
-def area_bottom(v, f):
-    down = np.array([0, 0, -1.0]); a = 0.0
-    for i, j, k in f:
-        n = np.cross(v[j]-v[i], v[k]-v[i]); n /= np.linalg.norm(n) + 1e-12
-        if np.dot(n, down) > .8: a += tri_area(v[i], v[j], v[k])
-    return a
-
-def area_side_max(v, f):
-    up = np.array([0, 0, 1.0]); areas=[]
-    for i,j,k in f:
-        n = np.cross(v[j]-v[i], v[k]-v[i]); n/=np.linalg.norm(n)+1e-12
-        if abs(np.dot(n, up))<.2: areas.append(tri_area(v[i],v[j],v[k]))
-    return max(areas, default=0.0)
-
-def compute_quantity(key, v, f):
-    area, vol = mesh_area_and_volume(v, f)
-    return {
-        "VOLUME_NET": vol,
-        "VOLUME_GROSS": vol,
-        "AREA_SURF_TOTAL": area,
-        "AREA_BOTTOM": area_bottom(v, f),
-        "AREA_SIDE_MAX": area_side_max(v, f),
-        "LENGTH_LONGEST": bbox_longest_edge(v),
-        "LENGTH_XY": bbox_diag_xy(v),
-        "HEIGHT_Z": bbox_height(v),
-    }.get(key)
+from helpers import content_hash, ifc_path_for, session_model
+from ifc_export import ifc_download_button
+from mesh_cache import MeshCache
+from model_index import bump_revision
+from prescan import suggested_geometry_settings, suggested_workers
+from property_writer import PropertyWriter
+from qto_pipeline import failures_frame, iter_element_metrics
+from tessellation import DEFAULT_THREADS, DEFAULT_TIMEOUT_S, MAX_THREADS, geom_settings
+from worklist import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, build_worklist, parse_classes
 
 # ───────────────────────── IFC helpers ─────────────────────────
 def get_project_unit(model, unit_type):
@@ -127,177 +89,41 @@ def upsert_pset(model, el, name="OEBBset_RC2_KE"):
     )
     return p
 
-def upsert_single_value(model, pset, name, value, ifc_type="IfcReal", unit=None):
-    ex = next((p for p in pset.HasProperties if p.Name == name), None)
-    if ex:
-        # allow None for numeric placeholders
-        if ex.NominalValue is not None and hasattr(ex.NominalValue, "wrappedValue"):
-            ex.NominalValue.wrappedValue = value
-        else:
-            ex.NominalValue = model.create_entity(ifc_type, value) if value is not None else None
-        ex.Unit = unit
-        return
-    pset.HasProperties += (
-        model.createIfcPropertySingleValue(
-            Name=name,
-            Description=None,
-            NominalValue=(model.create_entity(ifc_type, value) if value is not None else None),
-            Unit=unit,
-        ),
-    )
-
-def upsert_quantity(model, qset, qtype: str, name: str, unit, value_attr: str, value):
-    """Find quantity with same Name & type; update or append."""
-    for q in qset.Quantities or ():
-        if q.is_a(qtype) and getattr(q, "Name", None) == name:
-            setattr(q, value_attr, value)
-            q.Unit = unit
-            return q
-    qty = model.create_entity(
-        qtype,
-        Name=name,
-        Description=None,
-        Unit=unit,
-        **{value_attr: value},
-    )
-    qset.Quantities = (qset.Quantities or ()) + (qty,)
-    return qty
-
-# ───────────────────────── Streamlit UI ─────────────────────────
-st.header("🧮 Mapping-gesteuertes Quantity Take-Off")
-
-if "ifc_bytes" not in st.session_state:
-    st.error("Bitte auf der Startseite eine IFC-Datei hochladen.")
-    st.stop()
-
-upload_map = st.file_uploader(
-    "Mapping-Tabelle (CSV/XLSX)",
-    type=("csv", "xls", "xlsx"),
-    help="A=classification • B=title • D=prop_template(ignoriert) • E=quantity_type • F=unit_hint",
-)
-
-# clear cached outputs if new IFC or new mapping file
-if (
-    ("cached_ifc_name" in st.session_state and st.session_state.cached_ifc_name != st.session_state.ifc_name)
-    or ("mapping_filename" in st.session_state and upload_map and upload_map.name != st.session_state.mapping_filename)
-):
-    for k in ("qto_detailed_df", "qto_summary_df", "qto_ifc_path"):
-        st.session_state.pop(k, None)
-
-# show cached tables/downloads if available
-if "qto_detailed_df" in st.session_state:
-    det, summ = st.session_state.qto_detailed_df, st.session_state.qto_summary_df
-    st.dataframe(det, use_container_width=True, height=400)
-    st.markdown("### Zusammenfassung")
-    st.dataframe(summ, use_container_width=True, height=300)
-
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="xlsxwriter") as w:
-        summ.to_excel(w, index=False, sheet_name="Summary")
-        det.to_excel(w, index=False, sheet_name="Detailed")
-    st.download_button(
-        "📥 XLSX herunterladen",
-        buf.getvalue(),
-        file_name="quantities_summary.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        key="xlsx_dl",
-    )
-    with open(st.session_state.qto_ifc_path, "rb") as f:
-        st.download_button(
-            "💾 Geänderte IFC herunterladen",
-            f.read(),
-            file_name=Path(st.session_state.ifc_name).stem + "_mapped_qto.ifc",
-            mime="application/octet-stream",
-            key="ifc_dl",
-        )
-    st.stop()
-
-if upload_map is None:
-    st.info("Bitte Mapping-Datei hochladen.")
-    st.stop()
+# ───────────────────────── Qto run ─────────────────────────
+QTO_MAP = {
+    "IfcWall": "Qto_WallBaseQuantities",
+    "IfcWallStandardCase": "Qto_WallBaseQuantities",
+    "IfcSlab": "Qto_SlabBaseQuantities",
+    "IfcBeam": "Qto_BeamBaseQuantities",
+    "IfcColumn": "Qto_ColumnBaseQuantities",
+}
 
-# robust mapping reader: keep only A..F, ignore extras; normalize
-raw = (
-    pd.read_excel(upload_map, header=0)
-    if upload_map.name.lower().endswith(("xls", "xlsx"))
-    else pd.read_csv(upload_map)
-)
-NEEDED = 6  # A..F
-if raw.shape[1] < NEEDED:
-    for i in range(NEEDED - raw.shape[1]):
-        raw[f"_pad{i}"] = None
-
-df_map = raw.iloc[:, :NEEDED].copy()
-df_map.columns = ["classification", "title", "_", "prop_template", "quantity_type", "unit_hint"]
 
-# normalize + filter
-df_map["classification"] = df_map["classification"].astype(str).str.strip()
-df_map["title"]          = df_map["title"].astype(str).str.strip()
-df_map["quantity_type"]  = df_map["quantity_type"].astype(str).str.strip().str.upper()
-df_map["unit_hint"]      = df_map["unit_hint"].astype(str).str.strip()
-df_map = df_map.replace({"": pd.NA})
-df_map = df_map.dropna(subset=["classification", "quantity_type"])
-
-if st.button("⚙️ Mengen nach Mapping generieren"):
-    # load or reuse model
-    if "model" not in st.session_state:
-        model, _ = load_model_from_bytes(st.session_state.ifc_bytes)
-        st.session_state.model = model
-    else:
-        model = st.session_state.model
-
-    st.session_state.cached_ifc_name = st.session_state.ifc_name
-    st.session_state.mapping_filename = upload_map.name
-
-    settings = ifcopenshell.geom.settings()
-    settings.set(settings.USE_WORLD_COORDS, True)
+def write_mapped_quantities(model, candidates, map_dict, results):
+    """Write Qto + OEBBset_RC2_KE for every element in `results`; returns detail rows.
 
+    `results` may be partial (cancelled run) – elements without a result are skipped.
+    """
     unit_len  = get_project_unit(model, "LENGTHUNIT")
     unit_area = get_project_unit(model, "AREAUNIT")
     unit_vol  = get_project_unit(model, "VOLUMEUNIT")
 
-    # map for quick row access
-    map_dict = {str(r.classification): r for r in df_map.itertuples(index=False)}
-
-    QTO_MAP = {
-        "IfcWall": "Qto_WallBaseQuantities",
-        "IfcWallStandardCase": "Qto_WallBaseQuantities",
-        "IfcSlab": "Qto_SlabBaseQuantities",
-        "IfcBeam": "Qto_BeamBaseQuantities",
-        "IfcColumn": "Qto_ColumnBaseQuantities",
-    }
-
     processed = []
 
-    for el in model.by_type("IfcProduct"):
-        if not getattr(el, "GlobalId", None):
-            continue
-
-        # unique classification numbers per element (preserve order)
-        seen, uniq_nums = set(), []
-        for c in get_classification_strings(el):
-            num = c.split(":")[-1].strip() if ":" in c else c.strip()
-            if num in map_dict and num not in seen:
-                seen.add(num)
-                uniq_nums.append(num)
-        if not uniq_nums:
-            continue
-
-        # geometry
-        try:
-            sh = ifcopenshell.geom.create_shape(settings, el)
-        except Exception:
-            continue
-        v = np.asarray(sh.geometry.verts, float).reshape(-1, 3)
-        f = np.asarray(sh.geometry.faces, int).reshape(-1, 3)
-
-        # target pset
-        pset = upsert_pset(model, el, "OEBBset_RC2_KE")
+    for guid, (_, uniq_nums) in candidates.items():
+        if guid not in results:
+            continue  # no geometry, failed BREP or not reached before cancel
+        method, qvals = results[guid]
+        el = model.by_guid(guid)  # candidates may stem from the shared read-only model
+
+        # target pset; Qto set only once a value is written
+        props = PropertyWriter(model, upsert_pset(model, el, "OEBBset_RC2_KE"))
+        qtos = None
 
         # write once-per-element keys
         el_name = getattr(el, "Name", "") or ""
-        upsert_single_value(model, pset, "10_Vorhabenteil", el_name, ifc_type="IfcLabel")
-        upsert_single_value(model, pset, "11_Kommentar", "ND", ifc_type="IfcText")
+        props.single_value("10_Vorhabenteil", el_name, ifc_type="IfcLabel")
+        props.single_value("11_Kommentar", "ND", ifc_type="IfcText")
 
         # per classification
         for idx, num in enumerate(uniq_nums, 1):
@@ -307,15 +133,15 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
             if row.quantity_type == "COUNT_STK":
                 val, unit_obj, unit_label = 1.0, None, (row.unit_hint or "Stk" or "Stk")
             elif row.quantity_type.startswith("VOLUME"):
-                val = compute_quantity(row.quantity_type, v, f)
+                val = qvals[row.quantity_type]
                 unit_obj = unit_vol
                 unit_label = row.unit_hint or "m³"
             elif row.quantity_type.startswith("AREA"):
-                val = compute_quantity(row.quantity_type, v, f)
+                val = qvals[row.quantity_type]
                 unit_obj = unit_area
                 unit_label = row.unit_hint or "m²"
             else:
-                val = compute_quantity(row.quantity_type, v, f)
+                val = qvals[row.quantity_type]
                 unit_obj = unit_len
                 unit_label = row.unit_hint or "m"
 
@@ -323,7 +149,8 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
                 continue
 
             # QTO upsert
-            qto = upsert_qto_set(model, el, QTO_MAP.get(el.is_a(), "Qto_GenericBaseQuantities"))
+            if qtos is None:
+                qtos = PropertyWriter(model, upsert_qto_set(model, el, QTO_MAP.get(el.is_a(), "Qto_GenericBaseQuantities")))
             if row.quantity_type == "COUNT_STK":
                 qtype, attr = "IfcQuantityCount", "CountValue"
             elif row.quantity_type.startswith("VOLUME"):
@@ -333,26 +160,25 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
             else:
                 qtype, attr = "IfcQuantityLength", "LengthValue"
 
-            upsert_quantity(model, qset=qto, qtype=qtype, name=row.quantity_type,
-                            unit=unit_obj, value_attr=attr, value=val)
+            qtos.quantity(qtype, row.quantity_type, attr, val, unit=unit_obj)
 
             # ── OEBBset_RC2_KE numbering: 21–25 for first class, 31–35 for second, etc.
             base = 20 + 10 * (idx - 1)
             # 21/31/… Elementbezeichnung
-            upsert_single_value(model, pset, f"{base+1}_Elementbezeichnung",
-                                str(row.title), ifc_type="IfcText")
+            props.single_value(f"{base+1}_Elementbezeichnung",
+                               str(row.title), ifc_type="IfcText")
             # 22/32/… Menge (IfcReal) + keep IFC Unit
-            upsert_single_value(model, pset, f"{base+2}_Menge",
-                                float(val), ifc_type="IfcReal", unit=unit_obj)
+            props.single_value(f"{base+2}_Menge",
+                               float(val), ifc_type="IfcReal", unit=unit_obj)
             # 23/33/… Einheit (label)
-            upsert_single_value(model, pset, f"{base+3}_Einheit",
-                                unit_label, ifc_type="IfcLabel")
+            props.single_value(f"{base+3}_Einheit",
+                               unit_label, ifc_type="IfcLabel")
             # 24/34/… Element-Kennnummer (mapping column A)
-            upsert_single_value(model, pset, f"{base+4}_Element-Kennnummer",
-                                str(num), ifc_type="IfcLabel")
+            props.single_value(f"{base+4}_Element-Kennnummer",
+                               str(num), ifc_type="IfcLabel")
             # 25/35/… Dichte = "ND" (store as text placeholder)
-            upsert_single_value(model, pset, f"{base+5}_Dichte",
-                                "ND", ifc_type="IfcText")
+            props.single_value(f"{base+5}_Dichte",
+                               "ND", ifc_type="IfcText")
 
             processed.append(
                 dict(
@@ -363,9 +189,29 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
                     quantity_type=row.quantity_type,
                     unit=unit_label,
                     value=val,
+                    method=method,
                 )
             )
 
+        # one HasProperties / Quantities assignment per element
+        props.flush()
+        if qtos is not None:
+            qtos.flush()
+
+    bump_revision(model)
+    return processed
+
+
+def show_results(run):
+    """Write, tabulate, cache and offer the downloads for a finished or cancelled run."""
+    model = session_model(st.session_state, writable=True)
+    processed = write_mapped_quantities(model, run["candidates"], run["map_dict"], run["results"])
+    run["written"] = True
+
+    if run["failures"]:
+        st.warning(f"{len(run['failures'])} Elemente übersprungen (Timeout/Absturz der Geometrie).")
+        st.dataframe(failures_frame(model, run["failures"]), use_container_width=True)
+
     if not processed:
         st.warning("Keine passenden Elemente/Zeilen gefunden.")
         st.stop()
@@ -385,10 +231,6 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
     st.session_state.qto_detailed_df = det
     st.session_state.qto_summary_df = summ
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ifc")
-    model.write(tmp.name)
-    st.session_state.qto_ifc_path = tmp.name
-
     # downloads
     buf = io.BytesIO()
     with pd.ExcelWriter(buf, engine="xlsxwriter") as w:
@@ -401,13 +243,193 @@ if st.button("⚙️ Mengen nach Mapping generieren"):
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         key="xlsx_dl_gen",
     )
-    with open(st.session_state.qto_ifc_path, "rb") as f:
-        st.download_button(
-            "💾 Geänderte IFC herunterladen",
-            f.read(),
-            file_name=Path(st.session_state.ifc_name).stem + "_mapped_qto.ifc",
-            mime="application/octet-stream",
-            key="ifc_dl_gen",
-        )
+    ifc_download_button(
+        "💾 Geänderte IFC herunterladen",
+        model,
+        Path(st.session_state.ifc_name).stem + "_mapped_qto.ifc",
+        zipped=zip_out,
+        key="ifc_dl_gen",
+    )
+
+
+TAIL_ROWS = 100  # rows shown while a run is going
+
+
+def progress_frame(run, tail: int | None = None) -> pd.DataFrame:
+    """Result rows of a run (append-only `run["rows"]`), or only the last `tail` ones."""
+    rows = run["rows"][-tail:] if tail else run["rows"]
+    return pd.DataFrame(rows, columns=["guid", "method", *run["kinds"]])
+
+
+# ───────────────────────── Streamlit UI ─────────────────────────
+st.header("🧮 Mapping-gesteuertes Quantity Take-Off")
+
+if "ifc_bytes" not in st.session_state:
+    st.error("Bitte auf der Startseite eine IFC-Datei hochladen.")
+    st.stop()
+
+upload_map = st.file_uploader(
+    "Mapping-Tabelle (CSV/XLSX)",
+    type=("csv", "xls", "xlsx"),
+    help="A=classification • B=title • D=prop_template(ignoriert) • E=quantity_type • F=unit_hint",
+)
+zip_out = st.checkbox("IFC-Download als .ifcZIP komprimieren", value=False)
+
+# clear cached outputs if new IFC or new mapping file
+if (
+    ("cached_ifc_name" in st.session_state and st.session_state.cached_ifc_name != st.session_state.ifc_name)
+    or ("mapping_filename" in st.session_state and upload_map and upload_map.name != st.session_state.mapping_filename)
+):
+    for k in ("qto_detailed_df", "qto_summary_df", "mapping_qto_run"):
+        st.session_state.pop(k, None)
+
+# show cached tables/downloads if available
+if "qto_detailed_df" in st.session_state:
+    det, summ = st.session_state.qto_detailed_df, st.session_state.qto_summary_df
+    st.dataframe(det, use_container_width=True, height=400)
+    st.markdown("### Zusammenfassung")
+    st.dataframe(summ, use_container_width=True, height=300)
+
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="xlsxwriter") as w:
+        summ.to_excel(w, index=False, sheet_name="Summary")
+        det.to_excel(w, index=False, sheet_name="Detailed")
+    st.download_button(
+        "📥 XLSX herunterladen",
+        buf.getvalue(),
+        file_name="quantities_summary.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="xlsx_dl",
+    )
+    ifc_download_button(
+        "💾 Geänderte IFC herunterladen",
+        session_model(st.session_state),  # the copy the run wrote to
+        Path(st.session_state.ifc_name).stem + "_mapped_qto.ifc",
+        zipped=zip_out,
+        key="ifc_dl",
+    )
+    st.stop()
+
+if upload_map is None:
+    st.info("Bitte Mapping-Datei hochladen.")
+    st.stop()
+
+# robust mapping reader: keep only A..F, ignore extras; normalize
+raw = (
+    pd.read_excel(upload_map, header=0)
+    if upload_map.name.lower().endswith(("xls", "xlsx"))
+    else pd.read_csv(upload_map)
+)
+NEEDED = 6  # A..F
+if raw.shape[1] < NEEDED:
+    for i in range(NEEDED - raw.shape[1]):
+        raw[f"_pad{i}"] = None
+
+df_map = raw.iloc[:, :NEEDED].copy()
+df_map.columns = ["classification", "title", "_", "prop_template", "quantity_type", "unit_hint"]
+
+# normalize + filter
+df_map["classification"] = df_map["classification"].astype(str).str.strip()
+df_map["title"]          = df_map["title"].astype(str).str.strip()
+df_map["quantity_type"]  = df_map["quantity_type"].astype(str).str.strip().str.upper()
+df_map["unit_hint"]      = df_map["unit_hint"].astype(str).str.strip()
+df_map = df_map.replace({"": pd.NA})
+df_map = df_map.dropna(subset=["classification", "quantity_type"])
+
+# defaults follow the upload pre-scan (element count, BREP share)
+default_threads, default_isolate = suggested_geometry_settings(st.session_state.get("prescan"), DEFAULT_THREADS)
+threads = st.number_input(
+    "Threads für die Tessellierung", min_value=1, max_value=MAX_THREADS, value=default_threads, step=1
+)
+isolate = st.checkbox(
+    "Geometrie in isolierten Prozessen berechnen (Timeout je Element)",
+    value=default_isolate,
+    help="Schützt die Sitzung vor hängenden oder abstürzenden BREPs; etwas langsamer.",
+)
+timeout_s = st.number_input("Timeout je Element (s)", min_value=1.0, value=DEFAULT_TIMEOUT_S, disabled=not isolate)
+workers = st.number_input(
+    "Isolierte Prozesse",
+    min_value=1,
+    max_value=MAX_THREADS,
+    value=suggested_workers(st.session_state.get("prescan")),
+    step=1,
+    disabled=not isolate,
+    help="Jeder Prozess liest das ganze Modell ein – die Vorgabe richtet sich nach dem freien Arbeitsspeicher.",
+)
+col_in, col_ex = st.columns(2)
+include_txt = col_in.text_input("IFC-Klassen einschließen", value=", ".join(DEFAULT_INCLUDE))
+exclude_txt = col_ex.text_input("IFC-Klassen ausschließen", value=", ".join(DEFAULT_EXCLUDE))
+
+# a run lives in session state so that a cancel (= rerun) keeps finished elements
+run = st.session_state.get("mapping_qto_run")
+
+if st.button("⚙️ Mengen nach Mapping generieren"):
+    # geometry runs on the (possibly shared) model; writing switches to a private copy
+    model = session_model(st.session_state)
+
+    st.session_state.cached_ifc_name = st.session_state.ifc_name
+    st.session_state.mapping_filename = upload_map.name
+
+    # map for quick row access
+    map_dict = {str(r.classification): r for r in df_map.itertuples(index=False)}
+
+    # 1) pre-scan: elements carrying at least one mapped classification number
+    candidates, counts = build_worklist(
+        model,
+        include=parse_classes(include_txt),
+        exclude=parse_classes(exclude_txt),
+        mapping_keys=map_dict.keys(),
+    )
+    st.info(" • ".join(f"{k}: {v}" for k, v in counts.items()))
+
+    # requested metric kinds per element (shared by all of its classifications)
+    requested = {
+        guid: {map_dict[num].quantity_type for num in nums} - {"COUNT_STK"}
+        for guid, (el, nums) in candidates.items()
+    }
+
+    # 2) quantities: analytic → instanced → tessellated, streamed per element
+    run = st.session_state.mapping_qto_run = dict(
+        candidates=candidates, map_dict=map_dict, results={}, failures={},
+        rows=[], kinds=sorted(set().union(*requested.values())),
+        total=len(candidates), done=False, written=False,
+    )
+    st.button("⏹ Abbrechen", help="Bereits berechnete Elemente bleiben erhalten.")
+    bar = st.progress(0.0, text="Berechne Geometrie …")
+    table = st.empty()
+
+    ifc_hash = st.session_state.get("ifc_sha256") or content_hash(st.session_state.ifc_bytes)
+    stream = iter_element_metrics(
+        model,
+        {guid: el for guid, (el, _) in candidates.items()},
+        requested.__getitem__,
+        threads=int(threads),
+        cache=MeshCache(ifc_hash, geom_settings()),
+        isolate_path=ifc_path_for(st.session_state) if isolate else None,
+        timeout=float(timeout_s),
+        failures=run["failures"],
+        workers=int(workers),
+    )
+    last_draw = 0.0
+    for i, (guid, method, values) in enumerate(stream, 1):
+        run["results"][guid] = (method, values)
+        run["rows"].append((guid, method, *(values.get(kind) for kind in run["kinds"])))
+        bar.progress(min(i / max(run["total"], 1), 1.0), text=f"{i} / {run['total']} Elemente berechnet")
+        if time.monotonic() - last_draw > 0.5:  # redraw at most twice per second, newest rows only
+            table.dataframe(progress_frame(run, TAIL_ROWS), use_container_width=True, height=300)
+            last_draw = time.monotonic()
+    run["done"] = True
+    bar.empty()
+    table.empty()
+
+    # 3) write quantities + OEBBset_RC2_KE
+    show_results(run)
+
+elif run and not run["done"] and not run["written"]:
+    # the previous run was interrupted by "Abbrechen" (or any other widget)
+    st.warning(f"Abgebrochen – {len(run['results'])} von {run['total']} Elementen berechnet.")
+    st.dataframe(progress_frame(run), use_container_width=True, height=300)
+    if run["results"] and st.button("💾 Teilergebnisse schreiben"):
+        show_results(run)
 else:
     st.info("Mapping laden und auf **Mengen nach Mapping generieren** klicken.")
@@ -5,43 +5,19 @@ import io, math, itertools
 import pandas as pd
 import streamlit as st
 import ifcopenshell
-from helpers import load_model_from_bytes
+from helpers import session_model
+from model_index import ModelIndex, container_catalogue, model_index
 
 # ───────── utilities ─────────
 def is_number(x):
     return isinstance(x, (int, float)) and not (isinstance(x, float) and (math.isnan(x) or math.isinf(x)))
 
 def list_containers(model):
-    psets, qtos = set(), set()
-    for el in model.by_type("IfcObject"):
-        for rel in getattr(el, "IsDefinedBy", []) or []:
-            if not rel.is_a("IfcRelDefinesByProperties"):
-                continue
-            rd = rel.RelatingPropertyDefinition
-            if rd.is_a("IfcPropertySet") and rd.Name:
-                psets.add(rd.Name)
-            elif rd.is_a("IfcElementQuantity") and rd.Name:
-                qtos.add(rd.Name)
-    return sorted(psets), sorted(qtos)
+    cat = container_catalogue(model)  # cached until the model revision changes
+    return list(cat["Pset"]), list(cat["Qto"])
 
 def collect_fields(model, kind: str, name: str):
-    fields = set()
-    for el in model.by_type("IfcObject"):
-        for rel in getattr(el, "IsDefinedBy", []) or []:
-            if not rel.is_a("IfcRelDefinesByProperties"):
-                continue
-            rd = rel.RelatingPropertyDefinition
-            if kind == "Pset" and rd.is_a("IfcPropertySet") and rd.Name == name:
-                for p in rd.HasProperties or []:
-                    nm = getattr(p, "Name", None)
-                    if nm:
-                        fields.add(nm)
-            elif kind == "Qto" and rd.is_a("IfcElementQuantity") and rd.Name == name:
-                for q in rd.Quantities or []:
-                    nm = getattr(q, "Name", None)
-                    if nm:
-                        fields.add(nm)
-    return sorted(fields)
+    return container_catalogue(model)[kind].get(name, [])
 
 def unit_label_from_si(si_unit):
     if not si_unit:
@@ -55,60 +31,58 @@ def unit_label_from_si(si_unit):
     }
     return table.get(name, "")
 
-def read_pset_value(el, pset_name: str, prop_name: str):
-    for rel in getattr(el, "IsDefinedBy", []) or []:
-        if not rel.is_a("IfcRelDefinesByProperties"):
-            continue
-        pset = rel.RelatingPropertyDefinition
-        if pset.is_a("IfcPropertySet") and pset.Name == pset_name:
-            for p in pset.HasProperties or []:
-                if p.is_a("IfcPropertySingleValue") and p.Name == prop_name and p.NominalValue:
-                    return p.NominalValue.wrappedValue
-    return None
-
-def read_qto_value_and_unit(el, qto_name: str, qty_name: str):
-    for rel in getattr(el, "IsDefinedBy", []) or []:
-        if not rel.is_a("IfcRelDefinesByProperties"):
-            continue
-        qset = rel.RelatingPropertyDefinition
-        if qset.is_a("IfcElementQuantity") and qset.Name == qto_name:
-            for q in qset.Quantities or []:
-                if getattr(q, "Name", None) != qty_name:
-                    continue
-                for attr in ("AreaValue", "VolumeValue", "LengthValue", "CountValue", "WeightValue"):
-                    if hasattr(q, attr):
-                        val = getattr(q, attr)
-                        return val, unit_label_from_si(getattr(q, "Unit", None))
-    return None, ""
-
-def extract_single(el, kind: str, container: str, spec: str):
-    if spec == "guid":
-        return getattr(el, "GlobalId", "")
-    if spec == "name":
-        return getattr(el, "Name", "")
+# ───────── columnar extraction ─────────
+def read_container_columns(model, index: ModelIndex, kind: str, container: str, specs: set[str]) -> pd.DataFrame:
+    """One sweep over all objects → one column per requested spec (row = element, by_type order)."""
+    elements = [el for el in model.by_type("IfcObject") if getattr(el, "GlobalId", None)]
+    guids = [el.GlobalId for el in elements]
+    cols = {}
+    if "guid" in specs:
+        cols["guid"] = guids
+    if "name" in specs:
+        cols["name"] = [getattr(el, "Name", "") for el in elements]
+    fields = sorted(s for s in specs if s not in ("guid", "name"))
     if kind == "Pset":
-        return read_pset_value(el, container, spec)
-    if kind == "Qto":
-        if spec.endswith(" [Unit]"):
-            qty_name = spec[:-8]
-            _, u = read_qto_value_and_unit(el, container, qty_name)
-            return u
-        val, _u = read_qto_value_and_unit(el, container, spec)
-        return val
-    return None
-
-def gather_values(el, kind: str, container: str, specs: list[str]):
-    """Return list of values for this column for this element (one per selected spec),
-       skipping None. If specs empty → return [None] (no expansion).
-    """
-    if not specs:
-        return [None]
-    out = []
-    for s in specs:
-        v = extract_single(el, kind, container, s)
-        if v is not None and v != "":
-            out.append(v)
-    return out or [None]
+        recs = [index.pset(g, container) for g in guids]
+        for f in fields:
+            cols[f] = [r.get(f) for r in recs]
+    elif kind == "Qto":
+        qtys = sorted({f[: -len(" [Unit]")] if f.endswith(" [Unit]") else f for f in fields})
+        recs = [index.qto(g, container) for g in guids]
+        for q in qtys:
+            pairs = [r.get(q, (None, None)) for r in recs]
+            if q in specs:
+                cols[q] = [v for v, _ in pairs]
+            if f"{q} [Unit]" in specs:
+                cols[f"{q} [Unit]"] = [unit_label_from_si(u) for _, u in pairs]
+    frame = pd.DataFrame(cols, index=pd.RangeIndex(len(elements)), dtype=object)
+    frame["__IFC_NAME__"] = [getattr(el, "Name", "") for el in elements]
+    return frame
+
+def extract_table(model, index: ModelIndex, kind: str, container: str,
+                  col_specs: dict[str, list[str]], headers: list[str]) -> pd.DataFrame:
+    """Template table: per element and column the non-empty values of the selected
+    specs, paired by position (k-th value of every column → k-th row of the element)."""
+    wanted = {s for specs in col_specs.values() for s in specs}
+    cols = read_container_columns(model, index, kind, container, wanted)
+
+    # long form per header: (element, spec order, value), empties dropped
+    parts = []
+    for h in headers:
+        for order, spec in enumerate(col_specs.get(h, [])):
+            v = cols[spec]
+            v = v[v.notna() & (v != "")]
+            parts.append(pd.DataFrame({"el": v.index, "order": order, "header": h, "value": v.array}))
+    if not parts:
+        return pd.DataFrame(columns=headers + ["__IFC_NAME__"])
+    long = pd.concat(parts, ignore_index=True).sort_values(["el", "order"], kind="stable")
+    long["k"] = long.groupby(["el", "header"], sort=False).cumcount()
+
+    # k-th values side by side → one row per (element, k)
+    wide = long.set_index(["el", "k", "header"])["value"].unstack("header")
+    wide = wide.reindex(columns=headers).astype(object).where(lambda d: d.notna(), None)
+    wide["__IFC_NAME__"] = cols["__IFC_NAME__"].reindex(wide.index.get_level_values("el")).array
+    return wide.reset_index(drop=True)
 
 # ───────── UI ─────────
 st.header("📤 Pset/Qto → Excel (Mehrfachauswahl ⇒ mehrere Zeilen)")
@@ -117,14 +91,10 @@ if "ifc_bytes" not in st.session_state:
     st.error("Bitte laden Sie eine IFC-Datei auf der Startseite hoch.")
     st.stop()
 
-# Load model
-if "model" not in st.session_state:
-    model, _ = load_model_from_bytes(st.session_state.ifc_bytes)
-    st.session_state.model = model
-else:
-    model = st.session_state.model
+# Load model (read-only → shared cached parse)
+model = session_model(st.session_state)
 
-# 1) Source container
+# 1) Source container (names/fields from the cached catalogue – no rescan per rerun)
 psets, qtos = list_containers(model)
 choices = [f"Pset: {n}" for n in psets] + [f"Qto: {n}" for n in qtos]
 if not choices:
@@ -188,66 +158,14 @@ if sum_same_name:
 
 st.divider()
 if st.button("📄 Vorschau erzeugen"):
-    elements = [el for el in model.by_type("IfcObject") if getattr(el, "GlobalId", None)]
-    out_rows = []
-
     # Prepare order of columns
     col_specs = {h: list(specs) for h, specs in zip(map_df["Excel-Spalte"], map_df["Quelle(n)"])}
+    result = extract_table(model, model_index(model), kind, container_name, col_specs, headers)
 
-    for el in elements:
-        # Gather list of values per header
-        lists_per_col = {}
-        for h, specs in col_specs.items():
-            lists_per_col[h] = gather_values(el, kind, container_name, specs)
-
-        # Decide if we should output any rows for this element:
-        # if all lists are [None], skip this element entirely
-        has_any_value = any(any(v is not None and v != "" for v in vals) for vals in lists_per_col.values())
-        if not has_any_value:
-            continue
-
-        # # Expand rows by Cartesian product across columns
-        # # For columns with [None] we won't expand (single None keeps product size)
-        # col_order = headers[:]  # preserve template order
-        # product_lists = [lists_per_col[h] for h in col_order]
-        # for combo in itertools.product(*product_lists):
-        #     # Skip row that is entirely None (shouldn't happen due to has_any_value)
-        #     if all(v is None or v == "" for v in combo):
-        #         continue
-        #     row = {h: v for h, v in zip(col_order, combo)}
-        #     # Add hidden Ifc name for grouping preview/export
-        #     row["__IFC_NAME__"] = getattr(el, "Name", "")
-        #     out_rows.append(row)
-        # NEW (PAIR BY INDEX): create one row per index across columns
-        col_order = headers[:]  # preserve template order
-
-        # how many rows do we need for this element?
-        max_len = max(len(vals) for vals in lists_per_col.values())
-
-        for k in range(max_len):
-            row = {}
-            for h in col_order:
-                vals = lists_per_col[h]
-                # take kth value if present, otherwise leave empty for that column
-                row[h] = vals[k] if k < len(vals) else None
-            # add hidden IFC name for optional grouping
-            row["__IFC_NAME__"] = getattr(el, "Name", "")
-            # skip fully empty rows (shouldn’t happen due to has_any_value, but safe)
-            if any(v not in (None, "") for v in row.values()):
-                out_rows.append(row)
-
-
-    if not out_rows:
+    if result.empty:
         st.warning("Keine Werte gefunden für die aktuelle Zuordnung.")
         st.stop()
 
-    result = pd.DataFrame(out_rows)
-    # Ensure all template headers exist as columns (even if empty)
-    for h in headers:
-        if h not in result.columns:
-            result[h] = None
-    result = result[headers + ["__IFC_NAME__"]]
-
     st.success(f"{len(result)} Zeilen erzeugt.")
     st.markdown("**Vorschau (Einzeln, mit Mehrfachauswahl → mehrere Zeilen):**")
     st.dataframe(result.head(200), use_container_width=True, height=380)
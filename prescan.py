@@ -0,0 +1,168 @@
+# prescan.py
+"""
+Streaming pre-scan of an uploaded STEP file – no model is built.
+
+Reads the HEADER section (schema, authoring tool) and counts the DATA
+instances per entity type with one regex pass over decompressed chunks,
+so an upload can be characterised in a fraction of the parse time.
+Counts are estimates: instance definitions inside string literals would be
+counted too, which does not happen in practice.
+"""
+from __future__ import annotations
+
+import os
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import ifcopenshell
+
+from helpers import MODEL_MEMORY_FACTOR, STREAM_CHUNK, ifc_size, open_ifc_stream
+from tessellation import DEFAULT_WORKERS
+
+_INSTANCE = re.compile(rb"#\d+\s*=\s*([A-Za-z][A-Za-z0-9_]*)\s*\(")
+_SCHEMA = re.compile(r"FILE_SCHEMA\s*\(\s*\(\s*'([^']*)'")
+_FILE_NAME = re.compile(r"FILE_NAME\s*\((.*?)\)\s*;", re.S)
+_STRING = re.compile(r"'((?:[^']|'')*)'")
+
+# representation items grouped by how expensive they are to tessellate
+BREP_TYPES = ("IFCFACETEDBREP", "IFCADVANCEDBREP", "IFCFACETEDBREPWITHVOIDS", "IFCADVANCEDBREPWITHVOIDS")
+MESH_TYPES = ("IFCTRIANGULATEDFACESET", "IFCPOLYGONALFACESET")
+SWEPT_TYPES = ("IFCEXTRUDEDAREASOLID", "IFCSWEPTDISKSOLID", "IFCREVOLVEDAREASOLID")
+BOOLEAN_TYPES = ("IFCBOOLEANRESULT", "IFCBOOLEANCLIPPINGRESULT")
+
+PARALLEL_MIN_ELEMENTS = 2000
+ISOLATE_MIN_BREP_SHARE = 0.3
+WORKER_MEMORY_SHARE = 0.5  # of the available RAM for isolated workers, the rest stays with the app
+
+
+def _header(text: str) -> Dict[str, str]:
+    out = {"schema": "", "tool": "", "preprocessor": ""}
+    if m := _SCHEMA.search(text):
+        out["schema"] = m.group(1)
+    if m := _FILE_NAME.search(text):
+        strings = [s.replace("''", "'") for s in _STRING.findall(m.group(1))]
+        # FILE_NAME(name, time_stamp, (author), (organization), preprocessor_version, originating_system, authorization)
+        if len(strings) >= 3:
+            out["preprocessor"], out["tool"] = strings[-3], strings[-2]
+    return out
+
+
+def _schema(name: str) -> Optional[object]:
+    try:
+        return ifcopenshell.ifcopenshell_wrapper.schema_by_name(name.upper())
+    except Exception:
+        return None  # unknown / unsupported schema
+
+
+def _is_subtype(schema, type_name: str, of: str) -> bool:
+    try:
+        decl = schema.declaration_by_name(type_name)
+    except Exception:
+        return False
+    while decl is not None:
+        if decl.name() == of:
+            return True
+        decl = decl.supertype() if hasattr(decl, "supertype") else None
+    return False
+
+
+def prescan(byte_data) -> Dict[str, object]:
+    """Header + entity census of an upload (plain, .ifcZIP or gzip).
+
+    Returns a dict with schema, tool, preprocessor, size (uncompressed bytes),
+    counts (Counter of upper-case type names), instances, elements,
+    representations, breps, meshes, swept, booleans, mapped.
+    """
+    raw: Counter = Counter()
+    head_parts, in_header, tail = [], True, b""
+    with open_ifc_stream(byte_data) as stream:
+        while chunk := stream.read(STREAM_CHUNK):
+            if in_header:
+                head_parts.append(chunk.decode("utf-8", "replace"))
+                in_header = "ENDSEC;" not in head_parts[-1]
+            buf = tail + chunk
+            cut = buf.rfind(b";") + 1  # only complete instances; the rest carries over
+            raw.update(_INSTANCE.findall(buf, 0, cut))
+            tail = buf[cut:]
+    counts: Counter = Counter()
+    for t, n in raw.items():  # decode once per type, not per instance
+        counts[t.upper().decode()] += n
+    head = "".join(head_parts)
+    info: Dict[str, object] = _header(head[: head.find("ENDSEC;") + 7])
+    info["size"] = ifc_size(byte_data)
+    info["counts"] = counts
+    info["instances"] = sum(counts.values())
+
+    schema = _schema(str(info["schema"]))
+    info["elements"] = sum(
+        n for t, n in counts.items() if schema is not None and _is_subtype(schema, t, "IfcElement")
+    )
+    info["representations"] = counts["IFCSHAPEREPRESENTATION"]
+    info["breps"] = sum(counts[t] for t in BREP_TYPES)
+    info["meshes"] = sum(counts[t] for t in MESH_TYPES)
+    info["swept"] = sum(counts[t] for t in SWEPT_TYPES)
+    info["booleans"] = sum(counts[t] for t in BOOLEAN_TYPES)
+    info["mapped"] = counts["IFCMAPPEDITEM"]
+    return info
+
+
+def _brep_heavy(info: Dict[str, object]) -> bool:
+    solids = info["breps"] + info["meshes"] + info["swept"] + info["booleans"]
+    return bool(solids) and (info["breps"] + info["booleans"]) / solids >= ISOLATE_MIN_BREP_SHARE
+
+
+def suggested_geometry_settings(info: Optional[Dict[str, object]], threads: int) -> Tuple[int, bool]:
+    """Defaults for the Qto pages: (tessellation threads, isolate in processes)."""
+    if info is None:
+        return threads, False
+    return (threads if info["elements"] >= PARALLEL_MIN_ELEMENTS else 1), _brep_heavy(info)
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of RAM available for new processes (Linux), None if unknown."""
+    try:
+        with open("/proc/meminfo") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def suggested_workers(info: Optional[Dict[str, object]], available: Optional[int] = None) -> int:
+    """Isolated worker processes that fit into RAM – each one parses the whole model."""
+    if info is None:
+        return 1
+    available = available_memory() if available is None else available
+    if available is None:
+        return min(DEFAULT_WORKERS, 2)
+    per_worker = max(int(info["size"]) * MODEL_MEMORY_FACTOR, 1)
+    return max(1, min(DEFAULT_WORKERS, int(available * WORKER_MEMORY_SHARE // per_worker)))
+
+
+def recommendations(info: Dict[str, object]) -> Dict[str, str]:
+    """German hints for the UI: parse memory, threading, crash isolation."""
+    mem = info["size"] * MODEL_MEMORY_FACTOR
+    hints = {
+        "Arbeitsspeicher (geschätzt)": (
+            f"≈ {mem / 1024**3:.1f} GB" if mem >= 1024**3 else f"≈ {mem / 1024**2:.0f} MB"
+        ) + " nach dem Einlesen",
+    }
+    if info["elements"] >= PARALLEL_MIN_ELEMENTS:
+        hints["Tessellierung"] = "viele Bauteile – parallele Threads empfohlen"
+    else:
+        hints["Tessellierung"] = "wenige Bauteile – ein Thread genügt"
+    if _brep_heavy(info):
+        hints["Geometrie"] = (
+            f"hoher BREP-/Boolean-Anteil – isolierte Prozesse empfohlen (RAM reicht für {suggested_workers(info)})"
+        )
+    elif info["swept"] + info["mapped"]:
+        hints["Geometrie"] = "überwiegend Extrusionen/Instanzen – schnelle Pfade greifen"
+    if not info["schema"] or _schema(str(info["schema"])) is None:
+        hints["Schema"] = f"'{info['schema']}' wird von IfcOpenShell nicht unterstützt"
+    return hints
@@ -0,0 +1,88 @@
+# property_writer.py
+"""
+Batched upserts into one IfcPropertySet / IfcElementQuantity.
+
+Existing items are resolved through a name dict built once per set, new
+items are collected and the aggregate (HasProperties / Quantities) is
+assigned once on flush – instead of a linear scan plus a full tuple copy
+for every single property.
+
+    with PropertyWriter(model, pset) as props:
+        props.single_value("Pruefung", True, "IfcBoolean")
+        props.single_value("Menge_1", 1.5, "IfcVolumeMeasure")
+
+    with PropertyWriter(model, qset) as qtos:
+        qtos.quantity("IfcQuantityVolume", "GrossVolume", "VolumeValue", 1.5)
+"""
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+import ifcopenshell
+
+
+class PropertyWriter:
+    """Collects upserts for one property definition; use as context manager or call flush()."""
+
+    def __init__(self, model: ifcopenshell.file, definition):
+        self.model = model
+        self.definition = definition
+        self._attr = "Quantities" if definition.is_a("IfcElementQuantity") else "HasProperties"
+        self._items = list(getattr(definition, self._attr) or ())
+        self._by_name: Dict[str, object] = {}
+        self._by_name_type: Dict[Tuple[str, str], object] = {}
+        for item in self._items:  # first item of a name wins, like a linear scan would
+            self._by_name.setdefault(item.Name, item)
+            self._by_name_type.setdefault((item.Name, item.is_a()), item)
+        self._dirty = False
+
+    def __enter__(self) -> "PropertyWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+    def _append(self, item) -> None:
+        self._items.append(item)
+        self._by_name.setdefault(item.Name, item)
+        self._by_name_type.setdefault((item.Name, item.is_a()), item)
+        self._dirty = True
+
+    def single_value(self, name: str, value, ifc_type: str = "IfcReal", unit=None):
+        """Add or update IfcPropertySingleValue `name`; value None → empty NominalValue."""
+        prop = self._by_name.get(name)
+        if prop is not None:
+            if value is None:
+                prop.NominalValue = None
+            elif prop.NominalValue is not None and hasattr(prop.NominalValue, "wrappedValue"):
+                # new value of the existing type – the old instance may be shared with copies
+                prop.NominalValue = self.model.create_entity(prop.NominalValue.is_a(), value)
+            else:
+                prop.NominalValue = self.model.create_entity(ifc_type, value)
+            prop.Unit = unit
+            return prop
+        prop = self.model.createIfcPropertySingleValue(
+            Name=name,
+            Description=None,
+            NominalValue=self.model.create_entity(ifc_type, value) if value is not None else None,
+            Unit=unit,
+        )
+        self._append(prop)
+        return prop
+
+    def quantity(self, qtype: str, name: str, value_attr: str, value, unit=None):
+        """Add or update quantity `name` of type `qtype` (e.g. IfcQuantityVolume / VolumeValue)."""
+        qty = self._by_name_type.get((name, qtype))
+        if qty is not None:
+            setattr(qty, value_attr, value)
+            qty.Unit = unit
+            return qty
+        qty = self.model.create_entity(qtype, Name=name, Description=None, Unit=unit, **{value_attr: value})
+        self._append(qty)
+        return qty
+
+    def flush(self) -> None:
+        """Assign the aggregate once if items were added."""
+        if self._dirty:
+            setattr(self.definition, self._attr, self._items)
+            self._dirty = False
@@ -0,0 +1,101 @@
+# qto_pipeline.py
+"""
+Streaming quantity take-off shared by the Qto pages.
+
+iter_element_metrics() yields one result per element as soon as it is
+known, so the pages can show progress, grow the result table while the
+run is going and keep everything finished so far when the user cancels.
+
+Stages (cheapest first):
+  1) analytic   simple swept solids, no geometry kernel
+  2) instanced  one mesh per IfcRepresentationMap, per-instance transform
+                (skipped with isolated workers – map tessellation would run
+                in this process)
+  3) mesh       tessellation (geometry iterator or isolated workers)
+The model must not be modified while the generator is running.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+import pandas as pd
+import ifcopenshell
+
+from analytic import ANALYTIC, INSTANCED, KIND_MAP, MESH, analytic_quantities, unit_scale
+from geometry import MeshMetrics
+from mesh_cache import MeshCache
+from tessellation import (
+    DEFAULT_THREADS, DEFAULT_TIMEOUT_S, DEFAULT_WORKERS,
+    iter_map_meshes, iter_meshes, iter_meshes_isolated, mapped_instance,
+)
+
+Result = Tuple[str, str, Dict[str, Optional[float]]]  # (guid, method, {kind: value})
+
+
+def iter_element_metrics(
+    model: ifcopenshell.file,
+    elements: Dict[str, object],
+    kinds: Callable[[str], Set[str]],
+    threads: int = DEFAULT_THREADS,
+    cache: Optional[MeshCache] = None,
+    isolate_path: Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+    failures: Optional[Dict[str, str]] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> Iterator[Result]:
+    """Yield (guid, ANALYTIC | INSTANCED | MESH, {kind: value}) per element.
+
+    `elements` maps guid → element, `kinds(guid)` returns the MeshMetrics
+    kinds wanted for that element. Elements without usable geometry are not
+    yielded; with `isolate_path` all tessellation (mapped instances included)
+    runs in `workers` processes (each parses the model, so size them to the
+    RAM, see prescan.suggested_workers) and timeouts/crashes are recorded in
+    `failures`.
+    """
+    done = set()
+
+    # 1) analytic fast path when every requested kind is covered
+    scale = unit_scale(model)
+    for guid, el in elements.items():
+        wanted = kinds(guid)
+        if wanted <= KIND_MAP.keys():
+            q = analytic_quantities(el, scale)
+            if q is not None and all(KIND_MAP[key] in q for key in wanted):
+                done.add(guid)
+                yield guid, ANALYTIC, {key: q[KIND_MAP[key]] for key in wanted}
+
+    # 2) instanced geometry: metrics of each representation map are computed
+    #    once; only bbox/orientation kinds need the per-instance transform
+    instances = {}
+    if not isolate_path:  # with isolation the geometry kernel never runs in this process
+        for guid, el in elements.items():
+            if guid not in done and (inst := mapped_instance(el)) is not None:
+                instances[guid] = inst
+    rmaps = {rmap.id(): rmap for rmap, _ in instances.values()}
+    map_metrics = {mid: MeshMetrics(v, f) for mid, v, f in iter_map_meshes(rmaps.values(), cache=cache)}
+    for guid, (rmap, linear) in instances.items():
+        if rmap.id() in map_metrics:
+            done.add(guid)
+            metrics = map_metrics[rmap.id()].instance(linear)
+            yield guid, INSTANCED, {key: metrics.get(key) for key in kinds(guid)}
+
+    # 3) tessellate the rest (incl. instances whose map gave no mesh), evaluate only the requested kinds
+    rest = [el for guid, el in elements.items() if guid not in done]
+    if isolate_path:
+        meshes = iter_meshes_isolated(
+            isolate_path, rest, workers=workers, timeout=timeout, cache=cache, failures=failures
+        )
+    else:
+        meshes = iter_meshes(model, rest, threads=threads, cache=cache)
+    for guid, v, f in meshes:
+        metrics = MeshMetrics(v, f)
+        yield guid, MESH, {key: metrics.get(key) for key in kinds(guid)}
+
+
+# ---------- tables for the pages ----------
+def failures_frame(model: ifcopenshell.file, failures: Dict[str, str]) -> pd.DataFrame:
+    rows = []
+    for guid, reason in failures.items():
+        el = model.by_guid(guid)
+        rows.append((guid, el.is_a(), getattr(el, "Name", "") or "", reason))
+    return pd.DataFrame(rows, columns=["guid", "class", "name", "reason"])
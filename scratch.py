@@ -0,0 +1,123 @@
+# scratch.py
+"""
+Managed scratch space for temporary IFC files (downloads, on-disk copies).
+
+Layout:
+
+    <SCRATCH_DIR>/<session id>/<name>     one directory per Streamlit session
+
+• files are addressed by name, so rewriting e.g. the Qto download replaces
+  the previous one instead of piling up copies
+• sweep() removes directories of sessions that have ended (or, outside a
+  Streamlit runtime, that were idle for SESSION_IDLE_S) and then deletes the
+  least recently used files of other sessions until the total fits
+  SCRATCH_MAX_BYTES; it runs on every scratch_path() call
+• files of sessions the runtime reports as active are never evicted – e.g.
+  isolated tessellation workers reopen upload.ifc whenever one is replaced
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+SCRATCH_DIR = Path(os.environ.get("RC2_SCRATCH_DIR", Path(tempfile.gettempdir()) / "demo_rc2_ifc"))
+SCRATCH_MAX_BYTES = int(os.environ.get("RC2_SCRATCH_MB", "4096")) * 1024 * 1024
+SESSION_IDLE_S = float(os.environ.get("RC2_SCRATCH_IDLE_H", "12")) * 3600
+
+
+def _session_id(state) -> str:
+    """Streamlit session id if available (lets sweep() detect ended sessions)."""
+    sid = state.get("scratch_id")
+    if sid is None:
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+            ctx = get_script_run_ctx(suppress_warning=True)
+            sid = ctx.session_id if ctx is not None else None
+        except ImportError:
+            sid = None
+        sid = sid or f"local-{uuid.uuid4().hex}"
+        state["scratch_id"] = sid
+    return sid
+
+
+def _session_active(sid: str) -> Optional[bool]:
+    """True/False from the Streamlit runtime, None if there is no runtime."""
+    try:
+        from streamlit import runtime
+
+        if not runtime.exists():
+            return None
+        return runtime.get_instance().is_active_session(sid)
+    except Exception:
+        return None
+
+
+def session_dir(state, root: Path = SCRATCH_DIR) -> Path:
+    """Scratch directory of this session (st.session_state), created on demand."""
+    path = Path(root) / _session_id(state)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / ".used").touch()
+    return path
+
+
+def scratch_path(state, name: str, root: Path = SCRATCH_DIR, max_bytes: int = SCRATCH_MAX_BYTES) -> str:
+    """Path of scratch file `name` for this session; sweeps old files first."""
+    path = session_dir(state, root)
+    sweep(root, max_bytes, keep=path)
+    return str(path / name)
+
+
+def release(state, root: Path = SCRATCH_DIR) -> None:
+    """Delete the session's scratch directory (e.g. when a new IFC is uploaded)."""
+    sid = state.get("scratch_id")
+    if sid:
+        shutil.rmtree(Path(root) / sid, ignore_errors=True)
+
+
+def sweep(root: Path = SCRATCH_DIR, max_bytes: int = SCRATCH_MAX_BYTES, keep: Optional[Path] = None) -> None:
+    """Drop ended sessions, then least recently used files until the quota fits.
+
+    Files inside `keep` (the calling session) and of active sessions are
+    never evicted, so the quota may stay exceeded while they are in use.
+    """
+    root = Path(root)
+    if not root.exists():
+        return
+    now = time.time()
+    files = []
+    for sdir in root.iterdir():
+        if not sdir.is_dir() or sdir == keep:
+            continue
+        used = sdir / ".used"
+        active = _session_active(sdir.name)
+        idle = now - (used.stat().st_mtime if used.exists() else 0.0)
+        if active is False or (active is None and idle > SESSION_IDLE_S):
+            shutil.rmtree(sdir, ignore_errors=True)
+            continue
+        if active:
+            continue  # still in use, e.g. by a running isolated Qto
+        files += [f for f in sdir.iterdir() if f.is_file() and f.name != ".used"]
+
+    kept = sum(f.stat().st_size for f in keep.iterdir() if f.is_file()) if keep and keep.exists() else 0
+    stats = []
+    for f in files:
+        try:
+            st = f.stat()
+        except OSError:
+            continue  # removed concurrently
+        stats.append((st.st_mtime, st.st_size, f))
+    total = kept + sum(size for _, size, _ in stats)
+    for _, size, f in sorted(stats, key=lambda s: s[0]):
+        if total <= max_bytes:
+            break
+        try:
+            f.unlink()
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,318 @@
+# tessellation.py
+"""
+Tessellation stage for the Qto pages.
+
+Streams (guid, verts, faces) for a set of elements through
+ifcopenshell.geom.iterator, which tessellates on several threads, or –
+for models with pathological BREPs – through isolated worker processes
+with a per-element time budget.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import types
+from collections import deque
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import ifcopenshell
+import ifcopenshell.geom
+import ifcopenshell.util.placement
+
+from mesh_cache import MeshCache
+
+Mesh = Tuple[str, np.ndarray, np.ndarray]
+
+MAX_THREADS = 64  # upper bound of the thread inputs on the Qto pages
+DEFAULT_THREADS = min(os.cpu_count() or 1, MAX_THREADS)
+DEFAULT_WORKERS = min(DEFAULT_THREADS, 4)  # isolated processes – each one parses the whole model
+DEFAULT_TIMEOUT_S = 60.0
+
+# failure reasons reported by iter_meshes_isolated
+TIMEOUT = "timeout"
+CRASH = "crash"
+
+
+def geom_settings() -> ifcopenshell.geom.settings:
+    """Settings shared by all Qto pages (world coordinates, SI units)."""
+    settings = ifcopenshell.geom.settings()
+    settings.set(settings.USE_WORLD_COORDS, True)
+    # NOTE: By default the tessellated geometry often has openings subtracted.
+    # If you want "gross" values (incl. openings), configure settings accordingly
+    # for your IfcOpenShell build, or post-process as needed.
+    return settings
+
+
+def iter_meshes(
+    model: ifcopenshell.file,
+    elements: Iterable,
+    threads: Optional[int] = None,
+    settings: Optional[ifcopenshell.geom.settings] = None,
+    cache: Optional[MeshCache] = None,
+) -> Iterator[Mesh]:
+    """Yield (guid, verts (n,3) float, faces (m,3) int) per tessellated element.
+
+    Only `elements` are processed (include-filter); elements without
+    geometry or with a failing BREP are silently skipped by the kernel.
+    Order follows the iterator, not the input.
+
+    With a `cache` (built for the same settings) cached meshes are served
+    first and only the misses go through the geometry kernel; their results
+    (including "no geometry") are stored for the next run.
+    """
+    elements = list(elements)
+    if cache is not None:
+        misses = []
+        for el in elements:
+            hit = cache.get(el.GlobalId)
+            if hit is None:
+                misses.append(el)
+            elif len(hit[0]) and len(hit[1]):
+                yield (el.GlobalId, *hit)
+        elements = misses
+    if not elements:
+        return
+
+    it = ifcopenshell.geom.iterator(
+        settings or geom_settings(),
+        model,
+        max(1, threads or DEFAULT_THREADS),
+        include=elements,
+    )
+    done = set()
+    try:
+        if it.initialize():
+            while True:
+                shape = it.get()
+                # verts: flat array [x0,y0,z0, x1,y1,z1, ...]
+                verts = np.asarray(shape.geometry.verts, dtype=float).reshape(-1, 3)
+                faces = np.asarray(shape.geometry.faces, dtype=int).reshape(-1, 3)
+                done.add(shape.guid)
+                if cache is not None:
+                    cache.put(shape.guid, verts, faces)
+                if len(verts) and len(faces):
+                    yield shape.guid, verts, faces
+                if not it.next():
+                    break
+        if cache is not None:
+            # iterator finished: whatever it skipped has no usable geometry
+            for el in elements:
+                if el.GlobalId not in done:
+                    cache.put(el.GlobalId, np.empty((0, 3)), np.empty((0, 3), dtype=int))
+    finally:
+        if cache is not None:
+            cache.flush()
+
+
+# ---------- instanced geometry (IfcMappedItem) ----------
+def mapped_instance(element) -> Optional[Tuple[object, np.ndarray]]:
+    """(IfcRepresentationMap, 3×3 map→world linear transform) or None.
+
+    Only elements whose Body is a single IfcMappedItem with a uniform scale
+    and no openings qualify; their metrics follow from the map's mesh.
+    """
+    if getattr(element, "HasOpenings", None) or element.ObjectPlacement is None:
+        return None
+    rep = getattr(element, "Representation", None)
+    if rep is None:
+        return None
+    bodies = [r for r in rep.Representations if r.RepresentationIdentifier == "Body"]
+    if len(bodies) != 1 or len(bodies[0].Items) != 1 or not bodies[0].Items[0].is_a("IfcMappedItem"):
+        return None
+    item = bodies[0].Items[0]
+    mapping = ifcopenshell.util.placement.get_mappeditem_transformation(item)
+    if mapping is None:
+        return None  # 2D mapping target
+    linear = ifcopenshell.util.placement.get_local_placement(element.ObjectPlacement)[:3, :3] @ mapping[:3, :3]
+    gram = linear.T @ linear
+    if not np.allclose(gram, np.eye(3) * gram[0, 0], rtol=1e-6, atol=1e-9):
+        return None  # non-uniform scale changes area/volume per instance
+    return item.MappingSource, linear
+
+
+def iter_map_meshes(
+    rmaps: Iterable,
+    settings: Optional[ifcopenshell.geom.settings] = None,
+    cache: Optional[MeshCache] = None,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Yield (map id, verts, faces) once per IfcRepresentationMap, in map coordinates.
+
+    Maps without a mesh are not yielded; a failed tessellation is not cached,
+    so callers can fall back to tessellating the instances one by one.
+    """
+    settings = settings or geom_settings()
+    try:
+        for rmap in rmaps:
+            key = f"map:{rmap.id()}"
+            hit = cache.get(key) if cache is not None else None
+            if hit is None:
+                try:
+                    tri = ifcopenshell.geom.create_shape(settings, rmap.MappedRepresentation)
+                    tri = getattr(tri, "geometry", tri)
+                    hit = (
+                        np.asarray(tri.verts, dtype=float).reshape(-1, 3),
+                        np.asarray(tri.faces, dtype=int).reshape(-1, 3),
+                    )
+                except Exception:
+                    continue  # not "no geometry" – leave it to the per-element path
+                if cache is not None:
+                    cache.put(key, *hit)
+            if len(hit[0]) and len(hit[1]):
+                yield (rmap.id(), *hit)
+    finally:
+        if cache is not None:
+            cache.flush()
+
+
+# ---------- crash isolation ----------
+def _worker_main(path: str, wid: int, tasks, results) -> None:
+    """Worker process: open the model once, then tessellate guids from `tasks`."""
+    model = ifcopenshell.open(path)
+    settings = geom_settings()
+    results.put((wid, None, "ready", None))
+    while True:
+        guid = tasks.get()
+        if guid is None:
+            return
+        try:
+            shape = ifcopenshell.geom.create_shape(settings, model.by_guid(guid))
+            verts = np.asarray(shape.geometry.verts, dtype=float).reshape(-1, 3)
+            faces = np.asarray(shape.geometry.faces, dtype=int).reshape(-1, 3)
+            results.put((wid, guid, "ok", (verts, faces)))
+        except Exception as exc:  # no geometry or failed BREP
+            results.put((wid, guid, "error", str(exc)))
+
+
+class _Worker:
+    def __init__(self, ctx, path: str, wid: int, results):
+        self.wid = wid
+        self.tasks = ctx.Queue()
+        self.proc = ctx.Process(target=_worker_main, args=(path, wid, self.tasks, results), daemon=True)
+        # spawn re-runs __main__ in the child – under Streamlit that is the page script
+        main = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            self.proc.start()
+        finally:
+            sys.modules["__main__"] = main
+        self.ready = False
+        self.guid: Optional[str] = None
+        self.t0 = 0.0
+
+    def assign(self, guid: str) -> None:
+        self.guid, self.t0 = guid, time.monotonic()
+        self.tasks.put(guid)
+
+    def kill(self) -> None:
+        if self.proc.is_alive():
+            self.proc.kill()
+        self.proc.join(timeout=5)
+
+
+def iter_meshes_isolated(
+    path: str,
+    elements: Iterable,
+    workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT_S,
+    cache: Optional[MeshCache] = None,
+    failures: Optional[Dict[str, str]] = None,
+) -> Iterator[Mesh]:
+    """Like iter_meshes, but every element runs in a separate worker process.
+
+    `path` is the IFC file on disk (workers parse it themselves). An element
+    that exceeds `timeout` seconds or kills its worker (segfault, OOM) is
+    recorded in `failures` as TIMEOUT / CRASH, its worker is replaced, and the
+    remaining elements carry on.
+
+    Every worker holds its own parsed model. A worker that dies before it
+    has opened the model (typically out of memory) is not replaced – the run
+    continues with one worker less; only if a single worker cannot open the
+    model a RuntimeError is raised.
+    """
+    failures = {} if failures is None else failures
+    elements = list(elements)
+    if cache is not None:
+        misses = []
+        for el in elements:
+            hit = cache.get(el.GlobalId)
+            if hit is None:
+                misses.append(el)
+            elif len(hit[0]) and len(hit[1]):
+                yield (el.GlobalId, *hit)
+        elements = misses
+    if not elements:
+        return
+
+    ctx = mp.get_context("spawn")  # no fork of the (multi-threaded) Streamlit process
+    results = ctx.Queue()
+    pending = deque(el.GlobalId for el in elements)
+    next_wid = 0
+
+    def spawn() -> _Worker:
+        nonlocal next_wid
+        next_wid += 1
+        return _Worker(ctx, path, next_wid, results)
+
+    pool = {w.wid: w for w in (spawn() for _ in range(max(1, min(workers, len(pending)))))}
+    limit = len(pool)
+
+    def shrink(w: _Worker) -> None:
+        nonlocal limit
+        w.kill()
+        del pool[w.wid]
+        if limit == 1:
+            raise RuntimeError(f"Tessellation worker could not open {path}")
+        limit -= 1
+        if not pool and pending:
+            nw = spawn()
+            pool[nw.wid] = nw
+
+    def replace(w: _Worker, reason: str) -> None:
+        failures[w.guid] = reason
+        w.kill()
+        del pool[w.wid]
+        if pending:
+            nw = spawn()
+            pool[nw.wid] = nw
+
+    try:
+        while pool:
+            try:
+                wid, guid, status, payload = results.get(timeout=0.2)
+            except queue.Empty:
+                wid = None
+            w = pool.get(wid)
+            if w is not None:  # messages of killed workers are ignored
+                if status != "ready":
+                    if status == "ok":
+                        verts, faces = payload
+                    else:
+                        verts, faces = np.empty((0, 3)), np.empty((0, 3), dtype=int)
+                    if cache is not None:
+                        cache.put(guid, verts, faces)
+                    if len(verts) and len(faces):
+                        yield guid, verts, faces
+                w.ready, w.guid = True, None
+                if pending:
+                    w.assign(pending.popleft())
+                else:
+                    w.tasks.put(None)
+                    del pool[wid]
+
+            now = time.monotonic()
+            for w in list(pool.values()):
+                if w.guid is not None and not w.proc.is_alive():
+                    replace(w, CRASH)
+                elif w.guid is not None and now - w.t0 > timeout:
+                    replace(w, TIMEOUT)
+                elif w.guid is None and not w.proc.is_alive():
+                    shrink(w)  # died while parsing the model: too many workers for the RAM
+    finally:
+        for w in pool.values():
+            w.kill()
+        if cache is not None:
+            cache.flush()
@@ -0,0 +1,133 @@
+# tests/test_geometry.py
+"""
+geometry.py against the per-triangle loops it replaced (reference copies
+below, as they were in the Qto pages), on random meshes with degenerate
+triangles.
+"""
+from typing import Tuple
+
+import numpy as np
+import pytest
+
+import geometry as g
+
+
+# ───────────────────────── reference loops ─────────────────────────
+def tri_area(v0, v1, v2):
+    return 0.5 * np.linalg.norm(np.cross(v1 - v0, v2 - v0))
+
+def ref_mesh_area_and_volume(verts, faces) -> Tuple[float, float]:
+    area = vol = 0.0
+    for a, b, c in faces:
+        v0, v1, v2 = verts[a], verts[b], verts[c]
+        area += tri_area(v0, v1, v2)
+        vol += np.dot(v0, np.cross(v1, v2)) / 6.0
+    return area, abs(vol)
+
+def ref_bbox_longest_edge(v):  return float((v.max(0) - v.min(0)).max())
+def ref_bbox_height(v):        return float(np.ptp(v[:, 2]))
+def ref_bbox_diag_xy(v):       return float(np.linalg.norm(np.ptp(v[:, :2], 0)))
+
+def ref_area_bottom(v, f):
+    down = np.array([0, 0, -1.0]); a = 0.0
+    for i, j, k in f:
+        n = np.cross(v[j]-v[i], v[k]-v[i]); n /= np.linalg.norm(n) + 1e-12
+        if np.dot(n, down) > .8: a += tri_area(v[i], v[j], v[k])
+    return a
+
+def ref_area_side_max(v, f):
+    up = np.array([0, 0, 1.0]); areas=[]
+    for i,j,k in f:
+        n = np.cross(v[j]-v[i], v[k]-v[i]); n/=np.linalg.norm(n)+1e-12
+        if abs(np.dot(n, up))<.2: areas.append(tri_area(v[i],v[j],v[k]))
+    return max(areas, default=0.0)
+
+def ref_compute_quantity(key, v, f):
+    area, vol = ref_mesh_area_and_volume(v, f)
+    return {
+        "VOLUME_NET": vol,
+        "VOLUME_GROSS": vol,
+        "AREA_SURF_TOTAL": area,
+        "AREA_BOTTOM": ref_area_bottom(v, f),
+        "AREA_SIDE_MAX": ref_area_side_max(v, f),
+        "LENGTH_LONGEST": ref_bbox_longest_edge(v),
+        "LENGTH_XY": ref_bbox_diag_xy(v),
+        "HEIGHT_Z": ref_bbox_height(v),
+    }.get(key)
+
+
+# ───────────────────────── meshes ─────────────────────────
+def random_mesh(seed: int, n_verts: int = 60, n_faces: int = 400):
+    """Random triangles plus degenerate ones: repeated indices, collinear and
+    coincident vertices, and axis-aligned (bottom/side) faces."""
+    rng = np.random.default_rng(seed)
+    verts = rng.normal(size=(n_verts, 3))
+    verts[-3] = verts[0] + 0.5 * (verts[1] - verts[0])   # collinear with 0, 1
+    verts[-2] = verts[0]                                  # coincident with 0
+    verts[-1] = verts[1] * [1, 1, 0]                      # on z = 0
+    faces = rng.integers(0, n_verts, size=(n_faces, 3))
+    faces[:20, 1] = faces[:20, 0]                         # repeated index
+    faces[20:40] = [[i, i, i] for i in range(20)]         # point triangles
+    flat = np.array([[0, 1, n_verts - 3], [0, n_verts - 2, 2], [1, 0, n_verts - 2]])
+    faces = np.r_[faces, flat]
+    # a downward and an upright triangle so bottom/side areas are not empty
+    box = np.array([[0, 0, -5], [0, 1, -5], [1, 0, -5], [3, 0, 0], [3, 1, 0], [3, 0, 1.0]])
+    faces = np.r_[faces, [[n_verts, n_verts + 1, n_verts + 2], [n_verts + 3, n_verts + 4, n_verts + 5]]]
+    return np.r_[verts, box], faces
+
+
+SEEDS = range(6)
+
+
+def test_empty_mesh():
+    verts, faces = np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+    assert g.mesh_area_and_volume(verts, faces) == (0.0, 0.0)
+    assert g.area_bottom(verts, faces) == 0.0
+    assert g.area_side_max(verts, faces) == 0.0
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_area_and_volume(seed):
+    v, f = random_mesh(seed)
+    assert np.allclose(g.mesh_area_and_volume(v, f), ref_mesh_area_and_volume(v, f), rtol=1e-9)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bottom_and_side(seed):
+    v, f = random_mesh(seed)
+    assert np.isclose(g.area_bottom(v, f), ref_area_bottom(v, f), rtol=1e-9)
+    assert np.isclose(g.area_side_max(v, f), ref_area_side_max(v, f), rtol=1e-9)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bbox(seed):
+    v, _ = random_mesh(seed)
+    assert g.bbox_longest_edge(v) == pytest.approx(ref_bbox_longest_edge(v))
+    assert g.bbox_height(v) == pytest.approx(ref_bbox_height(v))
+    assert g.bbox_diag_xy(v) == pytest.approx(ref_bbox_diag_xy(v))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_mesh_metrics_get(seed):
+    v, f = random_mesh(seed)
+    metrics = g.MeshMetrics(v, f)
+    for kind in g.MeshMetrics.KINDS:
+        assert metrics.get(kind) == pytest.approx(ref_compute_quantity(kind, v, f), rel=1e-9), kind
+    assert metrics.get("COUNT_STK") is None
+
+
+def _rotation(rng) -> np.ndarray:
+    q, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    return q
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("scale", [1.0, 0.001, 2.5])
+def test_mesh_metrics_instance(seed, scale):
+    v, f = random_mesh(seed)
+    rng = np.random.default_rng(100 + seed)
+    linear = scale * _rotation(rng)           # includes mirrors (det < 0)
+    inst = g.MeshMetrics(v, f).instance(linear)
+    moved = v @ linear.T
+    for kind in g.MeshMetrics.KINDS:
+        assert inst.get(kind) == pytest.approx(ref_compute_quantity(kind, moved, f), rel=1e-9), kind
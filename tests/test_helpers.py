@@ -0,0 +1,107 @@
+# tests/test_helpers.py
+"""
+Shared RC2 P-sets: write_shared_psets groups elements by payload, own_pset
+splits an element off before in-place edits (copy-on-write), and neither
+leaves empty relations or orphaned P-sets behind.
+"""
+import ifcopenshell
+import ifcopenshell.guid
+import ifcopenshell.util.element
+import pytest
+
+from helpers import add_rc2_pset, own_pset, rc2_values, write_shared_psets
+from property_writer import PropertyWriter
+
+PSET = "OEBBset_RC2"
+
+
+@pytest.fixture
+def walls():
+    model = ifcopenshell.file(schema="IFC4")
+    return model, [model.createIfcWall(GlobalId=ifcopenshell.guid.new(), Name=f"W{i}") for i in range(4)]
+
+
+def pset_value(wall, name, pset=PSET):
+    return ifcopenshell.util.element.get_psets(wall)[pset][name]
+
+
+def psets_of(wall, pset=PSET):
+    return [
+        rel.RelatingPropertyDefinition for rel in wall.IsDefinedBy or ()
+        if rel.is_a("IfcRelDefinesByProperties") and rel.RelatingPropertyDefinition.Name == pset
+    ]
+
+
+def assert_clean(model):
+    """No relation without elements, no P-set or property without a user."""
+    assert all(rel.RelatedObjects for rel in model.by_type("IfcRelDefinesByProperties"))
+    assert all(model.get_total_inverses(pset) for pset in model.by_type("IfcPropertySet"))
+    assert all(model.get_total_inverses(prop) for prop in model.by_type("IfcPropertySingleValue"))
+
+
+def test_shared_write_groups_identical_payloads(walls):
+    model, ws = walls
+    assert write_shared_psets(model, PSET, {w: rc2_values(False, ["A"], 1.0) for w in ws}) == 1
+    assert len(model.by_type("IfcPropertySet")) == 1
+    assert len(model.by_type("IfcRelDefinesByProperties")) == 1
+    assert_clean(model)
+
+
+def test_per_element_write_only_changes_that_element(walls):
+    model, ws = walls
+    write_shared_psets(model, PSET, {w: rc2_values(False, ["A"], 1.0) for w in ws})
+    shared = psets_of(ws[0])[0]
+
+    # one row saved per element, like the RC2 page does for a non-shared sync
+    for i, w in enumerate(ws):
+        with PropertyWriter(model, own_pset(model, w, PSET)) as props:
+            props.single_value("Menge_1", 10.0 + i, "IfcVolumeMeasure")
+            if i == 0:
+                props.single_value("Pruefung", True, "IfcBoolean")
+
+    assert [pset_value(w, "Pruefung") for w in ws] == [True, False, False, False]
+    assert [pset_value(w, "Menge_1") for w in ws] == [10.0, 11.0, 12.0, 13.0]
+    assert all(len(psets_of(w)) == 1 for w in ws)
+    assert len({psets_of(w)[0].id() for w in ws}) == 4
+    assert psets_of(ws[3])[0] == shared  # the last user keeps the original set
+    assert_clean(model)
+
+
+def test_own_pset_keeps_or_creates_a_private_set(walls):
+    model, ws = walls
+    pset = own_pset(model, ws[0], PSET)  # missing → created
+    assert psets_of(ws[0]) == [pset] and not psets_of(ws[1])
+    assert own_pset(model, ws[0], PSET) == pset  # not shared → no copy
+    assert len(model.by_type("IfcPropertySet")) == 1
+
+
+def test_regrouping_removes_emptied_relations_and_orphans(walls):
+    model, ws = walls
+    write_shared_psets(model, PSET, {w: rc2_values(False, ["A"], 1.0) for w in ws})
+    old_rel = model.by_type("IfcRelDefinesByProperties")[0]
+    old_pset = old_rel.RelatingPropertyDefinition
+    old_ids = {old_rel.id(), old_pset.id(), *(p.id() for p in old_pset.HasProperties)}
+
+    # every wall gets its own payload → the shared set loses all elements
+    assert write_shared_psets(model, PSET, {w: rc2_values(False, [f"P{i}"], 1.0) for i, w in enumerate(ws)}) == 4
+    live = {e.id() for e in model}
+    assert not old_ids & live
+    assert [pset_value(w, "Position_1") for w in ws] == ["P0", "P1", "P2", "P3"]
+    assert_clean(model)
+
+    # and back to one group: the four private sets are dropped again
+    assert write_shared_psets(model, PSET, {w: rc2_values(True, ["A"], 2.0) for w in ws}) == 1
+    assert len(model.by_type("IfcPropertySet")) == 1
+    assert len(model.by_type("IfcRelDefinesByProperties")) == 1
+    assert [pset_value(w, "Pruefung") for w in ws] == [True] * 4
+    assert_clean(model)
+
+
+def test_add_rc2_pset_per_element_after_shared(walls):
+    model, ws = walls
+    add_rc2_pset(model, True, shared=True)
+    assert len([p for p in model.by_type("IfcPropertySet") if p.Name == "Oebb_RC2"]) == 1
+    add_rc2_pset(model, False, shared=False)
+    assert [pset_value(w, "Pruefung", "Oebb_RC2") for w in ws] == [False] * 4
+    assert all(len(psets_of(w, "Oebb_RC2")) == 1 for w in ws)
+    assert_clean(model)
@@ -0,0 +1,98 @@
+# tests/test_keyword_index.py
+"""
+Shortlist matching against a full scan of the catalog: exact mode must give
+the same keyword (first one on ties) and score as full_scan, and the fast
+mode must agree wherever its shortlist reaches 100.
+"""
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+
+import keyword_index
+from keyword_index import KeywordIndex, best_matches, full_scan
+
+VOCAB = ["wand", "stb", "beton", "decke", "25", "30", "tuer", "fenster", "holz", "basis", "aussen", "innen"]
+
+
+def random_text(rng, n_min=1, n_max=4) -> str:
+    words = list(rng.choice(VOCAB, size=rng.integers(n_min, n_max + 1)))
+    if rng.random() < 0.3:  # a token outside the vocabulary, matched by n-grams only
+        words.append("".join(rng.choice(list("abcdefghst"), size=rng.integers(2, 7))))
+    return " ".join(words)
+
+
+def catalog(seed: int, n_keywords: int = 150, n_blobs: int = 120):
+    rng = np.random.default_rng(seed)
+    keywords = [random_text(rng) for _ in range(n_keywords)]
+    keywords += keywords[:10]                                  # duplicates → tied scores
+    keywords += [" ".join(reversed(k.split())) for k in keywords[10:20]]  # same token set → tied scores
+    blobs = [random_text(rng, 1, 6) for _ in range(n_blobs)] + keywords[:15] + [""]
+    return blobs, keywords
+
+
+def reference(blobs, keywords):
+    """First keyword with the highest token_set_ratio (extractOne order)."""
+    idx, score = [], []
+    for blob in blobs:
+        scores = [fuzz.token_set_ratio(blob, kw) for kw in keywords]
+        idx.append(int(np.argmax(scores)))
+        score.append(max(scores))
+    return np.array(idx), np.array(score, dtype=float)
+
+
+@pytest.fixture(params=[1, 4], ids=["one-core", "cdist"])
+def cores(request, monkeypatch):
+    monkeypatch.setattr(keyword_index.os, "cpu_count", lambda: request.param)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_full_scan_keeps_first_keyword_on_ties(seed, cores):
+    blobs, keywords = catalog(seed)
+    idx, score = full_scan(blobs, keywords)
+    ref_idx, ref_score = reference(blobs, keywords)
+    assert np.array_equal(score, ref_score)
+    assert np.array_equal(idx, ref_idx)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("shortlist", [3, 50])
+def test_exact_mode_equals_full_scan(seed, shortlist, cores):
+    blobs, keywords = catalog(seed)
+    index = KeywordIndex(keywords, shortlist=shortlist)
+    idx, score = best_matches(blobs, keywords, index, exact=True)
+    full_idx, full_score = full_scan(blobs, keywords)
+    assert np.array_equal(idx, full_idx)
+    assert np.array_equal(score, full_score)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("shortlist", [3, 50])
+def test_shortlist_at_100_equals_full_scan(seed, shortlist):
+    blobs, keywords = catalog(seed)
+    index = KeywordIndex(keywords, shortlist=shortlist)
+    idx, score = best_matches(blobs, keywords, index)
+    full_idx, full_score = reference(blobs, keywords)
+    hit = score == 100
+    assert hit.any()
+    assert np.array_equal(idx[hit], full_idx[hit])
+    assert np.all(score <= full_score)
+    # a perfect keyword always shares a token, so the shortlist never misses it
+    assert np.array_equal(hit, full_score == 100)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_candidates_sorted_and_unique(seed):
+    blobs, keywords = catalog(seed)
+    index = KeywordIndex(keywords, shortlist=5)
+    for blob in blobs:
+        cand = index.candidates(blob)
+        assert np.array_equal(cand, np.unique(cand))
+        shared = {i for i, kw in enumerate(keywords) if set(kw.split()) & set(blob.split())}
+        assert shared <= set(cand.tolist())
+
+
+def test_empty_catalog():
+    idx, score = best_matches(["wand"], [], KeywordIndex([]))
+    assert score.tolist() == [0.0]
+    idx, score = best_matches(["wand"], [], KeywordIndex([]), exact=True)
+    assert score.tolist() == [0.0]
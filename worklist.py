@@ -0,0 +1,110 @@
+# worklist.py
+"""
+Pre-scan that decides which elements go to geometry processing.
+
+Cheap attribute/relationship checks only – nothing here touches the
+geometry kernel – so the counts can be shown before any tessellation.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import ifcopenshell
+
+from helpers import get_classification_strings
+from model_index import ModelIndex, model_index
+
+DEFAULT_INCLUDE: Tuple[str, ...] = ("IfcElement",)
+DEFAULT_EXCLUDE: Tuple[str, ...] = (
+    "IfcFeatureElementSubtraction",  # openings, voids
+    "IfcVirtualElement",
+)
+
+
+def parse_classes(text: str) -> List[str]:
+    """'IfcWall, IfcSlab' → ['IfcWall', 'IfcSlab']"""
+    return [c.strip() for c in text.replace(";", ",").split(",") if c.strip()]
+
+
+def element_has_qto(element, index: Optional[ModelIndex] = None) -> bool:
+    if index is not None:
+        return index.has_qto(element.GlobalId)
+    for rel in element.IsDefinedBy or []:
+        if rel.is_a("IfcRelDefinesByProperties"):
+            if rel.RelatingPropertyDefinition.is_a("IfcElementQuantity"):
+                return True
+    return False
+
+
+def has_body_geometry(element) -> bool:
+    return getattr(element, "Representation", None) is not None
+
+
+def mapped_classification_numbers(element, mapping_keys, index: Optional[ModelIndex] = None) -> List[str]:
+    """Unique classification numbers of `element` found in `mapping_keys` (order kept)."""
+    seen, uniq_nums = set(), []
+    for c in get_classification_strings(element, index):
+        num = c.split(":")[-1].strip() if ":" in c else c.strip()
+        if num in mapping_keys and num not in seen:
+            seen.add(num)
+            uniq_nums.append(num)
+    return uniq_nums
+
+
+def build_worklist(
+    model: ifcopenshell.file,
+    include: Sequence[str] = DEFAULT_INCLUDE,
+    exclude: Sequence[str] = DEFAULT_EXCLUDE,
+    skip_with_qto: bool = False,
+    mapping_keys: Optional[Iterable[str]] = None,
+) -> Tuple[Dict[str, tuple], Dict[str, int]]:
+    """Return ({guid: (element, classification numbers)}, counts).
+
+    • include / exclude  IFC classes (subtypes match, exclude wins)
+    • skip_with_qto      drop elements that already carry an IfcElementQuantity
+    • mapping_keys       keep only elements with at least one of these
+                         classification numbers (Mapping-Qto page)
+    Elements without a representation are dropped as well.
+    """
+    mapping_keys = set(mapping_keys) if mapping_keys is not None else None
+    counts = {
+        "IfcProduct": 0,
+        "Klasse ausgeschlossen": 0,
+        "ohne Geometrie": 0,
+        "Qto vorhanden": 0,
+        "ohne Mapping-Klassifikation": 0,
+        "zu berechnen": 0,
+    }
+    work: Dict[str, tuple] = {}
+    index = model_index(model)
+
+    for el in model.by_type("IfcProduct"):
+        if not getattr(el, "GlobalId", None):
+            continue
+        counts["IfcProduct"] += 1
+
+        if not any(el.is_a(c) for c in include) or any(el.is_a(c) for c in exclude):
+            counts["Klasse ausgeschlossen"] += 1
+            continue
+        if not has_body_geometry(el):
+            counts["ohne Geometrie"] += 1
+            continue
+        if skip_with_qto and element_has_qto(el, index):
+            counts["Qto vorhanden"] += 1  # keep author-supplied quantities
+            continue
+
+        nums: List[str] = []
+        if mapping_keys is not None:
+            nums = mapped_classification_numbers(el, mapping_keys, index)
+            if not nums:
+                counts["ohne Mapping-Klassifikation"] += 1
+                continue
+
+        work[el.GlobalId] = (el, nums)
+        counts["zu berechnen"] += 1
+
+    if mapping_keys is None:
+        del counts["ohne Mapping-Klassifikation"]
+    if not skip_with_qto:
+        del counts["Qto vorhanden"]
+    return work, counts